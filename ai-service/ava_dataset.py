@@ -1,9 +1,14 @@
 import os
+import io
+import json
+import mmap
+import tarfile
 import torch
 from torch.utils.data import Dataset, DataLoader
 from PIL import Image
 import torchvision.transforms as transforms
 import numpy as np
+import pandas as pd
 from pathlib import Path
 
 
@@ -25,7 +30,7 @@ class AVADataset(Dataset):
         """
         Args:
             image_ids: list of image ID strings
-            scores:    list of float aesthetic scores (0-100)
+            scores:    float32 array of aesthetic scores (0-100)
             images_path: path to AVA images folder
             transform: torchvision transforms
         """
@@ -34,14 +39,16 @@ class AVADataset(Dataset):
         self.images_path = Path(images_path)
         self.transform = transform
 
+        # Build paths once so __getitem__ does no Path/f-string work per sample
+        self._img_paths = [str(self.images_path / f"{img_id}.jpg") for img_id in image_ids]
+
     def __len__(self):
         return len(self.image_ids)
 
     def __getitem__(self, idx):
-        img_id = self.image_ids[idx]
         score = self.scores[idx]
 
-        img_path = self.images_path / f"{img_id}.jpg"
+        img_path = self._img_paths[idx]
         try:
             image = Image.open(img_path).convert('RGB')
         except Exception:
@@ -51,41 +58,258 @@ class AVADataset(Dataset):
         if self.transform:
             image = self.transform(image)
 
-        return image, torch.tensor(score, dtype=torch.float32)
+        # np.float32 scalar; default collate stacks the batch into one float32 tensor
+        return image, score
+
+
+class AVAShardDataset(Dataset):
+    """
+    AVA dataset read from uncompressed .tar shards (see pack_ava_shards).
+
+    Each shard is memory-mapped once per worker and samples are sliced out of
+    it, replacing an open/read/close per image with reads from a few large
+    files that stay hot in the page cache.
+    """
+
+    def __init__(self, image_ids, scores, shard_index, transform=None):
+        """
+        Args:
+            image_ids:   list of image ID strings
+            scores:      float32 array of aesthetic scores (0-100)
+            shard_index: dict from load_ava_shard_index (image_id -> shard, offset, size)
+            transform:   torchvision transforms
+        """
+        self.image_ids = image_ids
+        self.scores = scores
+        self.transform = transform
+
+        self._locations = [shard_index[img_id] for img_id in image_ids]
+        self._shards = {}  # shard path -> mmap, opened lazily in each worker
+
+    def __getstate__(self):
+        # mmaps can't be sent to worker processes; each worker opens its own
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def _read_bytes(self, idx):
+        shard_path, offset, size = self._locations[idx]
+        shard = self._shards.get(shard_path)
+        if shard is None:
+            with open(shard_path, 'rb') as f:
+                shard = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._shards[shard_path] = shard
+        return shard[offset:offset + size]
+
+    def __getitem__(self, idx):
+        score = self.scores[idx]
+
+        try:
+            image = Image.open(io.BytesIO(self._read_bytes(idx))).convert('RGB')
+        except Exception:
+            # Return a black image if the entry is corrupt
+            image = Image.new('RGB', (224, 224), (0, 0, 0))
+
+        if self.transform:
+            image = self.transform(image)
+
+        # np.float32 scalar; default collate stacks the batch into one float32 tensor
+        return image, score
+
+
+class AVACachedDataset(Dataset):
+    """
+    AVA dataset read from a pre-decoded uint8 image cache (see build_ava_image_cache).
+
+    Images are stored already resized to 256x256 in one memory-mapped .npy
+    array, so fetching a sample is a memcpy from the page cache with no JPEG
+    decode. Transforms receive uint8 (3, 256, 256) tensors instead of PIL images.
+    """
+
+    def __init__(self, image_ids, scores, cache_path, transform=None):
+        """
+        Args:
+            image_ids:  list of image ID strings
+            scores:     float32 array of aesthetic scores (0-100)
+            cache_path: folder containing ava_u8.npy and ava_u8_ids.json
+            transform:  torchvision transforms that accept uint8 tensors
+        """
+        self.image_ids = image_ids
+        self.scores = scores
+        self.cache_path = Path(cache_path)
+        self.transform = transform
+
+        cache_rows = load_ava_cache_ids(cache_path)
+        self._rows = [cache_rows[img_id] for img_id in image_ids]
+        self._images = None  # memmap, opened lazily in each worker
+
+    def __getstate__(self):
+        # Each worker maps the cache file itself
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __getitem__(self, idx):
+        score = self.scores[idx]
+
+        if self._images is None:
+            self._images = np.load(self.cache_path / 'ava_u8.npy', mmap_mode='r')
+        # HWC uint8 row copied out of the page cache, then viewed as CHW
+        image = torch.from_numpy(np.array(self._images[self._rows[idx]])).permute(2, 0, 1)
+
+        if self.transform:
+            image = self.transform(image)
+
+        # np.float32 scalar; default collate stacks the batch into one float32 tensor
+        return image, score
+
+
+def build_ava_image_cache(image_ids, images_path, cache_path, size=256):
+    """
+    Decode and resize AVA jpgs once into a memory-mapped uint8 array (one-time preprocessing).
+
+    Writes ava_u8.npy with shape (N, size, size, 3) and ava_u8_ids.json with the
+    image_id of each row. Needs N * size * size * 3 bytes of disk (~50 GB for
+    the full AVA set at 256x256).
+
+    Args:
+        image_ids:   list of image ID strings
+        images_path: path to AVA images folder
+        cache_path:  output folder for the cache
+        size:        side length images are resized to
+
+    Returns:
+        number of images written
+    """
+    images_path = Path(images_path)
+    cache_path = Path(cache_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    images = np.lib.format.open_memmap(
+        cache_path / 'ava_u8.npy', mode='w+', dtype=np.uint8,
+        shape=(len(image_ids), size, size, 3),
+    )
+    for row, img_id in enumerate(image_ids):
+        try:
+            with Image.open(images_path / f"{img_id}.jpg") as image:
+                # Same bilinear resize as transforms.Resize((256, 256)) on PIL images
+                images[row] = np.asarray(image.convert('RGB').resize((size, size), Image.BILINEAR))
+        except Exception:
+            # Leave a black image for missing/corrupt files
+            images[row] = 0
+    images.flush()
+    del images
+
+    with open(cache_path / 'ava_u8_ids.json', 'w') as f:
+        json.dump(list(image_ids), f)
+
+    return len(image_ids)
+
+
+def load_ava_cache_ids(cache_path):
+    """Load ava_u8_ids.json as image_id -> row in ava_u8.npy."""
+    with open(Path(cache_path) / 'ava_u8_ids.json', 'r') as f:
+        return {img_id: row for row, img_id in enumerate(json.load(f))}
+
+
+def pack_ava_shards(image_ids, images_path, shards_path, shard_size_mb=1024):
+    """
+    Pack AVA jpgs into uncompressed .tar shards (one-time preprocessing).
+
+    Writes ava-00000.tar, ava-00001.tar, ... of roughly shard_size_mb each,
+    plus shard_index.json mapping image_id -> [shard file, data offset, size].
+
+    Args:
+        image_ids:     list of image ID strings (files must exist as <id>.jpg)
+        images_path:   path to AVA images folder
+        shards_path:   output folder for the shards
+        shard_size_mb: target shard size in MB
+
+    Returns:
+        number of shards written
+    """
+    images_path = Path(images_path)
+    shards_path = Path(shards_path)
+    shards_path.mkdir(parents=True, exist_ok=True)
+    shard_limit = shard_size_mb * 1024 * 1024
+
+    shard_files = []
+    tar = None
+    for img_id in image_ids:
+        if tar is None or tar.offset >= shard_limit:
+            if tar is not None:
+                tar.close()
+            shard_files.append(shards_path / f"ava-{len(shard_files):05d}.tar")
+            tar = tarfile.open(shard_files[-1], 'w')
+        tar.add(images_path / f"{img_id}.jpg", arcname=f"{img_id}.jpg")
+    if tar is not None:
+        tar.close()
+
+    # Record where each jpg's bytes start inside its shard
+    index = {}
+    for shard_file in shard_files:
+        with tarfile.open(shard_file, 'r') as tar:
+            for member in tar:
+                if member.isfile():
+                    index[member.name[:-len('.jpg')]] = [shard_file.name, member.offset_data, member.size]
+
+    with open(shards_path / 'shard_index.json', 'w') as f:
+        json.dump(index, f)
+
+    return len(shard_files)
+
+
+def load_ava_shard_index(shards_path):
+    """Load shard_index.json as image_id -> (absolute shard path, offset, size)."""
+    shards_path = Path(shards_path)
+    with open(shards_path / 'shard_index.json', 'r') as f:
+        index = json.load(f)
+    shard_paths = {}
+    return {
+        img_id: (shard_paths.setdefault(name, str(shards_path / name)), offset, size)
+        for img_id, (name, offset, size) in index.items()
+    }
 
 
 def parse_ava_txt(ava_txt_path):
     """
-    Parse AVA.txt and return (image_ids, scores_0_100).
+    Parse AVA.txt and return (image_ids, scores_0_100 as a float32 array).
 
     Score formula:
         mean = sum(vote_i * i for i in 1..10) / sum(vote_i)
         normalized = (mean - 1) / 9 * 100   →  0-100 range
     """
-    image_ids = []
-    scores = []
-
-    with open(ava_txt_path, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 12:
-                continue
-
-            img_id = parts[1]
-            votes = np.array([float(x) for x in parts[2:12]])  # votes for scores 1-10
-            total_votes = votes.sum()
-
-            if total_votes == 0:
-                continue
+    # Only image_id (col 1) and the 10 vote counts (cols 2-11) are needed;
+    # tags/challenge columns are never parsed
+    vote_cols = list(range(2, 12))
+    df = pd.read_csv(
+        ava_txt_path,
+        sep=r'\s+',
+        header=None,
+        usecols=[1] + vote_cols,
+        dtype={1: str, **{c: np.float32 for c in vote_cols}},
+    )
+    df = df.dropna(subset=vote_cols)  # malformed/short rows
 
-            score_values = np.arange(1, 11, dtype=float)
-            mean_score = (votes * score_values).sum() / total_votes  # 1-10
-            normalized = (mean_score - 1.0) / 9.0 * 100.0           # 0-100
+    # Score all images at once: (N, 10) float32 votes @ score values
+    image_ids = df[1].tolist()
+    votes = df[vote_cols].to_numpy(dtype=np.float32)
+    total_votes = votes.sum(axis=1)
+    has_votes = total_votes > 0
 
-            image_ids.append(img_id)
-            scores.append(float(normalized))
+    # (mean - 1) / 9 * 100 folded into the per-bucket weights:
+    #   sum(vote_i * (i - 1) * 100 / 9) / sum(vote_i)
+    score_weights = np.arange(10, dtype=np.float32) * np.float32(100.0 / 9.0)
+    normalized = votes[has_votes] @ score_weights / total_votes[has_votes]  # 0-100
 
-    return image_ids, scores
+    image_ids = [img_id for img_id, keep in zip(image_ids, has_votes) if keep]
+    return image_ids, normalized
 
 
 def create_ava_data_loaders(
@@ -95,6 +319,8 @@ def create_ava_data_loaders(
     num_workers=4,
     val_split=0.05,
     random_seed=42,
+    shards_path=None,
+    cache_path=None,
 ):
     """
     Create train/val DataLoaders for AVA pretraining.
@@ -106,6 +332,13 @@ def create_ava_data_loaders(
         num_workers:   DataLoader workers
         val_split:     fraction of data for validation (default 5%)
         random_seed:   reproducibility seed
+        shards_path:   folder of .tar shards from pack_ava_shards; when given,
+                       images are read from the shards instead of images_path
+        cache_path:    folder with the pre-decoded cache from build_ava_image_cache;
+                       when given, images are read from the cache (no JPEG decode).
+                       Validation images are then resized 256 -> 224 from the cached
+                       copy rather than straight from the original JPEG, so val
+                       metrics can differ slightly from an uncached run
 
     Returns:
         train_loader, val_loader, split_info dict
@@ -113,60 +346,84 @@ def create_ava_data_loaders(
     print(f"Parsing AVA.txt from: {ava_txt_path}")
     image_ids, scores = parse_ava_txt(ava_txt_path)
     print(f"  Total entries: {len(image_ids):,}")
-    print(f"  Score range: {min(scores):.1f} - {max(scores):.1f}")
-    print(f"  Mean score: {np.mean(scores):.1f}")
+    print(f"  Score range: {scores.min():.1f} - {scores.max():.1f}")
+    print(f"  Mean score: {scores.mean():.1f}")
 
     # Filter to images that actually exist (single directory scan — much faster than per-file checks)
     images_path = Path(images_path)
-    print("Scanning images directory...")
-    available_ids = {p.stem for p in images_path.iterdir() if p.suffix.lower() == '.jpg'}
-    print(f"  Found {len(available_ids):,} jpg files on disk")
-
-    valid_ids = []
-    valid_scores = []
-    for img_id, score in zip(image_ids, scores):
-        if img_id in available_ids:
-            valid_ids.append(img_id)
-            valid_scores.append(score)
+    if cache_path:
+        print(f"Loading image cache index from: {cache_path}")
+        available_ids = load_ava_cache_ids(cache_path).keys()
+        print(f"  Found {len(available_ids):,} cached images")
+    elif shards_path:
+        print(f"Loading shard index from: {shards_path}")
+        shard_index = load_ava_shard_index(shards_path)
+        available_ids = shard_index.keys()
+        print(f"  Found {len(available_ids):,} jpg files in shards")
+    else:
+        print("Scanning images directory...")
+        available_ids = {p.stem for p in images_path.iterdir() if p.suffix.lower() == '.jpg'}
+        print(f"  Found {len(available_ids):,} jpg files on disk")
+
+    keep = np.fromiter((img_id in available_ids for img_id in image_ids), dtype=bool, count=len(image_ids))
+    valid_ids = [img_id for img_id, k in zip(image_ids, keep) if k]
+    valid_scores = scores[keep]
 
     print(f"  Matched: {len(valid_ids):,} / {len(image_ids):,} entries")
 
-    # Train/val split
+    # Train/val split, stratified by score bin so val matches the train score distribution
+    # (bin edges at AVA mean scores 3.5 / 4.5 / 5.5 / 6.5, mapped to the 0-100 scale)
+    score_bins = (np.array([3.5, 4.5, 5.5, 6.5]) - 1.0) / 9.0 * 100.0
+    labels = np.digitize(valid_scores, score_bins).astype(np.int8)
+
     rng = np.random.default_rng(random_seed)
-    indices = np.arange(len(valid_ids))
-    rng.shuffle(indices)
+    val_mask = np.zeros(len(labels), dtype=bool)
+    for label in np.unique(labels):
+        bin_idx = np.flatnonzero(labels == label)
+        rng.shuffle(bin_idx)
+        val_mask[bin_idx[:int(len(bin_idx) * val_split)]] = True
 
-    n_val = int(len(indices) * val_split)
-    val_idx = indices[:n_val]
-    train_idx = indices[n_val:]
+    val_idx = np.flatnonzero(val_mask)
+    train_idx = np.flatnonzero(~val_mask)
 
     train_ids = [valid_ids[i] for i in train_idx]
-    train_scores = [valid_scores[i] for i in train_idx]
+    train_scores = valid_scores[train_idx]
     val_ids = [valid_ids[i] for i in val_idx]
-    val_scores = [valid_scores[i] for i in val_idx]
+    val_scores = valid_scores[val_idx]
 
     print(f"  Train: {len(train_ids):,}  |  Val: {len(val_ids):,}")
 
-    # Transforms
+    # Transforms (uint8 output; normalization runs on the device via get_gpu_transform)
     train_transform = transforms.Compose([
         transforms.Resize((256, 256)),
         transforms.RandomCrop(224),
         transforms.RandomHorizontalFlip(),
         transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                             std=[0.229, 0.224, 0.225]),
+        transforms.PILToTensor(),
     ])
 
     val_transform = transforms.Compose([
         transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                             std=[0.229, 0.224, 0.225]),
+        transforms.PILToTensor(),
     ])
 
-    train_dataset = AVADataset(train_ids, train_scores, images_path, train_transform)
-    val_dataset = AVADataset(val_ids, val_scores, images_path, val_transform)
+    if cache_path:
+        # Cached images are already 256x256 uint8 tensors; same augmentations, tensor ops
+        cached_train_transform = transforms.Compose([
+            transforms.RandomCrop(224),
+            transforms.RandomHorizontalFlip(),
+            transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
+        ])
+        # Two-step (original -> 256 -> 224) resize; see cache_path in the docstring
+        cached_val_transform = transforms.Resize((224, 224), antialias=True)
+        train_dataset = AVACachedDataset(train_ids, train_scores, cache_path, cached_train_transform)
+        val_dataset = AVACachedDataset(val_ids, val_scores, cache_path, cached_val_transform)
+    elif shards_path:
+        train_dataset = AVAShardDataset(train_ids, train_scores, shard_index, train_transform)
+        val_dataset = AVAShardDataset(val_ids, val_scores, shard_index, val_transform)
+    else:
+        train_dataset = AVADataset(train_ids, train_scores, images_path, train_transform)
+        val_dataset = AVADataset(val_ids, val_scores, images_path, val_transform)
 
     train_loader = DataLoader(
         train_dataset,
@@ -175,7 +432,7 @@ def create_ava_data_loaders(
         num_workers=num_workers,
         pin_memory=True,
         persistent_workers=(num_workers > 0),
-        prefetch_factor=2 if num_workers > 0 else None,
+        prefetch_factor=4 if num_workers > 0 else None,
     )
 
     val_loader = DataLoader(
@@ -185,7 +442,7 @@ def create_ava_data_loaders(
         num_workers=num_workers,
         pin_memory=True,
         persistent_workers=(num_workers > 0),
-        prefetch_factor=2 if num_workers > 0 else None,
+        prefetch_factor=4 if num_workers > 0 else None,
     )
 
     split_info = {
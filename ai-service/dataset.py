@@ -1,13 +1,26 @@
 import os
 import pandas as pd
 import torch
-from torch.utils.data import Dataset, DataLoader
+import torch.nn as nn
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 from PIL import Image
 import torchvision.transforms as transforms
 from sklearn.model_selection import train_test_split
 import numpy as np
 from pathlib import Path
 import json
+try:
+    import kornia.augmentation as K
+    KORNIA_AVAILABLE = True
+except ImportError:
+    KORNIA_AVAILABLE = False
+
+
+IMAGE_EXTENSIONS = ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
 
 class AADBPhotographyDataset(Dataset):
     """
@@ -15,7 +28,7 @@ class AADBPhotographyDataset(Dataset):
     Provides attribute-level scores: composition, color, focus, exposure.
     """
     
-    def __init__(self, df, images_path, transform=None):
+    def __init__(self, df, images_path, transform=None, available_files=None):
         """
         Initialize dataset with pre-split DataFrame.
         
@@ -23,6 +36,8 @@ class AADBPhotographyDataset(Dataset):
             df (pandas.DataFrame): DataFrame with AADB labels
             images_path (str): Path to AADB images directory
             transform (torchvision.transforms): Image transformations
+            available_files (set): File names in images_path from scan_image_files;
+                scanned here if not given (pass it to share one scan across splits)
         """
         self.df = df.copy()
         self.images_path = Path(images_path)
@@ -31,8 +46,19 @@ class AADBPhotographyDataset(Dataset):
         # AADB provides scores in 0-1 range, scale to 0-100
         self._normalize_scores()
         
-        # Filter out missing images
-        self._filter_existing_images()
+        # Filter out missing images (single directory scan)
+        if available_files is None:
+            available_files = scan_image_files(self.images_path)
+        self._filter_existing_images(available_files)
+        
+        # Resolve image paths once so __getitem__ does no path formatting or stat() calls
+        self._img_paths = [
+            self._resolve_image_path(image_id, available_files) for image_id in self.df['image_id']
+        ]
+        
+        # (N, 5) float32 target matrix so __getitem__ never touches the DataFrame
+        self._score_names = ['composition_score', 'color_score', 'focus_score', 'exposure_score', 'overall_score']
+        self._scores = np.ascontiguousarray(self.df[self._score_names].to_numpy(dtype=np.float32))
         
         print(f"Dataset initialized: {len(self.df)} images")
         if len(self.df) > 0:
@@ -73,11 +99,9 @@ class AADBPhotographyDataset(Dataset):
             if normalized_attrs:
                 if our_col == 'composition_score' and len(normalized_attrs) >= 2:
                     # Take average of top 2 attributes for each image
-                    attrs_df = pd.concat(normalized_attrs, axis=1)
-                    # Sort each row and take mean of top 2 values
-                    self.df[our_col] = attrs_df.apply(
-                        lambda row: row.nlargest(2).mean(), axis=1
-                    )
+                    attrs = pd.concat(normalized_attrs, axis=1).to_numpy()
+                    # Sort each row and take mean of top 2 values (vectorized, no per-row apply)
+                    self.df[our_col] = np.sort(attrs, axis=1)[:, -2:].mean(axis=1)
                     print(f"  {our_col}: top-2 average of {len(normalized_attrs)} attributes")
                 else:
                     # Regular average for color, focus, exposure
@@ -96,34 +120,34 @@ class AADBPhotographyDataset(Dataset):
             print("Warning: No score columns found, using default")
             self.df['overall_score'] = 50.0
     
-    def _filter_existing_images(self):
+    def _filter_existing_images(self, available_files):
         """Remove entries where image files don't exist."""
-        existing_mask = []
-        missing_count = 0
+        # If not found as-is, accept the same base name with a different extension (for compatibility)
+        available_stems = {
+            name.rsplit('.', 1)[0] for name in available_files
+            if os.path.splitext(name)[1] in IMAGE_EXTENSIONS
+        }
         
-        for _, row in self.df.iterrows():
-            # AADB image_id already includes extension
-            img_path = self.images_path / row['image_id']
-            img_found = img_path.exists()
-            
-            # If not found, try with different extensions (for compatibility)
-            if not img_found:
-                base_name = row['image_id'].rsplit('.', 1)[0]  # Remove extension if present
-                for ext in ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']:
-                    img_path_alt = self.images_path / f"{base_name}{ext}"
-                    if img_path_alt.exists():
-                        img_found = True
-                        break
-            
-            existing_mask.append(img_found)
-            if not img_found:
-                missing_count += 1
+        # AADB image_id already includes extension
+        base_names = self.df['image_id'].str.rsplit('.', n=1).str[0]
+        existing_mask = self.df['image_id'].isin(available_files) | base_names.isin(available_stems)
+        missing_count = int((~existing_mask).sum())
         
         if missing_count > 0:
             print(f"Warning: {missing_count} image files not found")
         
         self.df = self.df[existing_mask].reset_index(drop=True)
     
+    def _resolve_image_path(self, image_id, available_files):
+        """Return the on-disk path for an image_id, trying other extensions if needed."""
+        # AADB image_id already includes extension
+        if image_id not in available_files:
+            base_name = image_id.rsplit('.', 1)[0]
+            for ext in IMAGE_EXTENSIONS:
+                if f"{base_name}{ext}" in available_files:
+                    return str(self.images_path / f"{base_name}{ext}")
+        return str(self.images_path / image_id)
+    
     def __len__(self):
         """Return dataset size."""
         return len(self.df)
@@ -133,21 +157,10 @@ class AADBPhotographyDataset(Dataset):
         Get a single sample from the dataset.
         
         Returns:
-            tuple: (image_tensor, scores_dict, metadata_dict)
+            tuple: (image_tensor, scores_dict)
         """
-        row = self.df.iloc[idx]
-        
-        # Load image (image_id already includes extension from AADB labels)
-        img_path = self.images_path / row['image_id']
-        
-        # If not found with image_id as-is, try without extension and different extensions
-        if not img_path.exists():
-            base_name = row['image_id'].rsplit('.', 1)[0]
-            for ext in ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']:
-                test_path = self.images_path / f"{base_name}{ext}"
-                if test_path.exists():
-                    img_path = test_path
-                    break
+        # Load image (path resolved once in __init__)
+        img_path = self._img_paths[idx]
         
         try:
             image = Image.open(img_path).convert('RGB')
@@ -160,21 +173,20 @@ class AADBPhotographyDataset(Dataset):
         if self.transform:
             image = self.transform(image)
         
-        # Get all attribute scores as dict
-        scores = {
-            'composition_score': torch.tensor(row['composition_score'], dtype=torch.float32),
-            'color_score': torch.tensor(row['color_score'], dtype=torch.float32),
-            'focus_score': torch.tensor(row['focus_score'], dtype=torch.float32),
-            'exposure_score': torch.tensor(row['exposure_score'], dtype=torch.float32),
-            'overall_score': torch.tensor(row['overall_score'], dtype=torch.float32)
-        }
-        
-        # Metadata for debugging
-        metadata = {
-            'image_id': row['image_id']
-        }
+        # Get all attribute scores as dict of np.float32 scalars
+        # (default collate stacks each key into a float32 tensor)
+        scores = dict(zip(self._score_names, self._scores[idx]))
         
-        return image, scores, metadata
+        # Tensors only, so default collate + pin_memory can pin the whole batch
+        # (image ids remain available via dataset.df['image_id'] for debugging)
+        return image, scores
+
+
+def scan_image_files(images_path):
+    """Return the set of file names in images_path (one directory scan, empty if missing)."""
+    if not os.path.isdir(images_path):
+        return set()
+    return {entry.name for entry in os.scandir(images_path) if entry.is_file()}
 
 
 def load_aadb_attribute_file(file_path):
@@ -266,7 +278,8 @@ def load_aadb_labels(labels_file):
 
 
 def create_data_loaders(train_labels_path, test_labels_path, images_path, 
-                       batch_size=16, num_workers=4, val_split=0.15):
+                       batch_size=16, num_workers=4, val_split=0.15, pin_memory=True,
+                       distributed=False):
     """
     Create train/val/test data loaders for AADB dataset.
     
@@ -277,6 +290,9 @@ def create_data_loaders(train_labels_path, test_labels_path, images_path,
         batch_size: Batch size for training
         num_workers: Number of data loading workers
         val_split: Fraction of train set to use for validation
+        pin_memory: Return batches in page-locked memory (async H2D copies)
+        distributed: Shard train/val across DDP ranks with DistributedSampler
+            (requires an initialized process group; batch_size is per rank)
     
     Returns:
         tuple: (train_loader, val_loader, test_loader, split_info)
@@ -315,45 +331,62 @@ def create_data_loaders(train_labels_path, test_labels_path, images_path,
     print(f"  Val:   {len(val_df_split)} images")
     print(f"  Test:  {len(test_df)} images")
     
-    # Define transforms
-    train_transform = transforms.Compose([
-        transforms.Resize((256, 256)),
-        transforms.RandomCrop(224),
-        transforms.RandomHorizontalFlip(p=0.5),
-        transforms.RandomRotation(degrees=15),
-        transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
-        transforms.RandomAffine(degrees=0, translate=(0.1, 0.1)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-    ])
+    # Define transforms (workers output uint8 tensors; see get_gpu_transform)
+    if KORNIA_AVAILABLE:
+        # Flip/rotation/color jitter/affine run batched on the device instead
+        train_transform = transforms.Compose([
+            transforms.Resize((256, 256)),
+            transforms.RandomCrop(224),
+            transforms.PILToTensor()
+        ])
+    else:
+        train_transform = transforms.Compose([
+            transforms.Resize((256, 256)),
+            transforms.RandomCrop(224),
+            transforms.RandomHorizontalFlip(p=0.5),
+            transforms.RandomRotation(degrees=15),
+            transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1),
+            transforms.RandomAffine(degrees=0, translate=(0.1, 0.1)),
+            transforms.PILToTensor()
+        ])
     
     val_test_transform = transforms.Compose([
         transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        transforms.PILToTensor()
     ])
     
-    # Create datasets
-    train_dataset = AADBPhotographyDataset(train_df_split, images_path, train_transform)
-    val_dataset = AADBPhotographyDataset(val_df_split, images_path, val_test_transform)
-    test_dataset = AADBPhotographyDataset(test_df, images_path, val_test_transform)
+    # Create datasets (one directory scan shared by all three splits)
+    available_files = scan_image_files(images_path)
+    train_dataset = AADBPhotographyDataset(train_df_split, images_path, train_transform, available_files)
+    val_dataset = AADBPhotographyDataset(val_df_split, images_path, val_test_transform, available_files)
+    test_dataset = AADBPhotographyDataset(test_df, images_path, val_test_transform, available_files)
+    
+    # Each DDP rank sees its own shard (call train_loader.sampler.set_epoch every epoch)
+    train_sampler = DistributedSampler(train_dataset, shuffle=True, drop_last=True) if distributed else None
+    val_sampler = DistributedSampler(val_dataset, shuffle=False) if distributed else None
     
     # Create data loaders
     train_loader = DataLoader(
         train_dataset,
         batch_size=batch_size,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=num_workers,
-        pin_memory=True,
-        drop_last=True
+        pin_memory=pin_memory,
+        drop_last=True,
+        persistent_workers=(num_workers > 0),
+        prefetch_factor=4 if num_workers > 0 else None
     )
     
     val_loader = DataLoader(
         val_dataset,
         batch_size=batch_size,
         shuffle=False,
+        sampler=val_sampler,
         num_workers=num_workers,
-        pin_memory=True
+        pin_memory=pin_memory,
+        persistent_workers=(num_workers > 0),
+        prefetch_factor=4 if num_workers > 0 else None
     )
     
     test_loader = DataLoader(
@@ -361,7 +394,9 @@ def create_data_loaders(train_labels_path, test_labels_path, images_path,
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers,
-        pin_memory=True
+        pin_memory=pin_memory,
+        persistent_workers=(num_workers > 0),
+        prefetch_factor=4 if num_workers > 0 else None
     )
     
     split_info = {
@@ -380,6 +415,92 @@ def create_data_loaders(train_labels_path, test_labels_path, images_path,
     return train_loader, val_loader, test_loader, split_info
 
 
+class CUDAPrefetcher:
+    """
+    Iterate a DataLoader with batches already on the device.
+    
+    On CUDA the next batch's host-to-device copy is issued on a side stream
+    while the caller computes on the current batch, so the training stream
+    never waits on a copy. On other devices batches are copied inline.
+    
+    Yields:
+        tuple: (images, targets) on the device; targets may be a tensor or a
+            dict of tensors, as produced by the wrapped loader
+    """
+    
+    def __init__(self, loader, device, memory_format=torch.channels_last):
+        self.loader = loader
+        self.device = torch.device(device)
+        self.memory_format = memory_format
+        self.stream = torch.cuda.Stream(device=self.device) if self.device.type == 'cuda' else None
+    
+    def __len__(self):
+        return len(self.loader)
+    
+    def _to_device(self, images, targets):
+        images = images.to(self.device, non_blocking=True, memory_format=self.memory_format)
+        if isinstance(targets, dict):
+            targets = {k: v.to(self.device, non_blocking=True) for k, v in targets.items()}
+        else:
+            targets = targets.to(self.device, non_blocking=True)
+        return images, targets
+    
+    def _preload(self, loader_iter):
+        try:
+            images, targets = next(loader_iter)
+        except StopIteration:
+            return None
+        with torch.cuda.stream(self.stream):
+            return self._to_device(images, targets)
+    
+    def __iter__(self):
+        if self.stream is None:
+            for images, targets in self.loader:
+                yield self._to_device(images, targets)
+            return
+        
+        loader_iter = iter(self.loader)
+        batch = self._preload(loader_iter)
+        while batch is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_stream(self.stream)
+            images, targets = batch
+            # Allocated on the side stream but consumed on the current one;
+            # keeps the caching allocator from reusing the memory too early
+            images.record_stream(current_stream)
+            for t in (targets.values() if isinstance(targets, dict) else (targets,)):
+                t.record_stream(current_stream)
+            batch = self._preload(loader_iter)
+            yield images, targets
+
+
+def get_gpu_transform(train=False):
+    """
+    Batch-level transform applied on the training device after the H2D copy.
+    
+    Data loaders return uint8 image batches; this converts them to float32
+    and applies ImageNet normalization for the whole batch at once.
+    
+    Args:
+        train: If True and kornia is installed, also apply the AADB training
+            augmentations (per-sample, on the device) that create_data_loaders
+            then leaves out of the worker-side train transform.
+    
+    Returns:
+        nn.Sequential: uint8 (B, 3, H, W) -> normalized float32 (B, 3, H, W)
+    """
+    layers = [transforms.ConvertImageDtype(torch.float32)]
+    if train and KORNIA_AVAILABLE:
+        layers += [
+            K.RandomHorizontalFlip(p=0.5),
+            K.RandomRotation(degrees=15.0, p=1.0),
+            K.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1, p=1.0),
+            K.RandomAffine(degrees=0, translate=(0.1, 0.1), p=1.0),
+        ]
+    layers.append(transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD))
+    return nn.Sequential(*layers)
+
+
 # Test the dataset
 if __name__ == "__main__":
     # Test paths (update these to your actual paths)
@@ -395,7 +516,7 @@ if __name__ == "__main__":
         )
         
         # Test loading one batch
-        images, scores, metadata = next(iter(train_loader))
+        images, scores = next(iter(train_loader))
         print(f"\n✅ Batch test successful!")
         print(f"  Images shape: {images.shape}")
         print(f"  Composition scores: {scores['composition_score'][:2].tolist()}")
@@ -11,13 +11,12 @@ import argparse
 import json
 from pathlib import Path
 
-import numpy as np
 import torch
-from scipy.stats import pearsonr, spearmanr
+from scipy.stats import spearmanr
 from tqdm import tqdm
 
-from dataset import create_data_loaders
-from model import create_model
+from dataset import create_data_loaders, get_gpu_transform
+from model import create_model, load_checkpoint
 
 
 ATTRIBUTES = ['composition_score', 'color_score', 'focus_score', 'exposure_score', 'overall_score']
@@ -39,7 +38,7 @@ def evaluate(checkpoint_path: str, split: str = 'test', labels_path: str = None,
 
     # ── Load checkpoint ───────────────────────────────────────────────────────
     print(f"\nLoading checkpoint: {ckpt_path}")
-    checkpoint = torch.load(ckpt_path, map_location=device, weights_only=False)
+    checkpoint = load_checkpoint(ckpt_path)
 
     config = checkpoint.get('config')
     if config is None:
@@ -55,7 +54,8 @@ def evaluate(checkpoint_path: str, split: str = 'test', labels_path: str = None,
     print(f"Backbone: {backbone}")
 
     # ── Model ─────────────────────────────────────────────────────────────────
-    model, _, _ = create_model(backbone=backbone, pretrained=False, device=device)
+    model, _, _ = create_model(backbone=backbone, pretrained=False, device=device,
+                               head_norm=config.get('head_norm', 'batchnorm'))
     model.load_state_dict(checkpoint['model_state_dict'])
     model.eval()
 
@@ -70,42 +70,50 @@ def evaluate(checkpoint_path: str, split: str = 'test', labels_path: str = None,
         val_split=config.get('val_split', 0.15),
     )
 
+    gpu_transform = get_gpu_transform()
     loader = {'test': test_loader, 'val': val_loader, 'train': train_loader}[split]
     print(f"\nRunning inference on {split} split ({len(loader.dataset)} images)...")
 
-    # ── Collect predictions and ground truth ──────────────────────────────────
-    all_preds  = {attr: [] for attr in ATTRIBUTES}
-    all_labels = {attr: [] for attr in ATTRIBUTES}
+    # ── Collect predictions and ground truth (kept on the device) ─────────────
+    pred_chunks  = []
+    label_chunks = []
 
-    with torch.no_grad():
-        for images, targets, _ in tqdm(loader):
-            images = images.to(device)
+    with torch.inference_mode():
+        for images, targets in tqdm(loader):
+            images = gpu_transform(images.to(device, non_blocking=True, memory_format=torch.channels_last))
             preds = model(images)
 
-            for attr in ATTRIBUTES:
-                pred_vals = preds[attr].cpu().numpy()
-                true_vals = targets[attr].numpy()
-                # Handle scalar output when batch_size == 1
-                all_preds[attr].extend(np.atleast_1d(pred_vals).tolist())
-                all_labels[attr].extend(np.atleast_1d(true_vals).tolist())
+            # (batch, 5) per batch; reshape handles the scalar output when batch_size == 1
+            pred_chunks.append(torch.stack([preds[attr].reshape(-1) for attr in ATTRIBUTES], dim=1))
+            label_chunks.append(torch.stack([targets[attr] for attr in ATTRIBUTES], dim=1)
+                                .to(device, non_blocking=True))
+
+    preds_all  = torch.cat(pred_chunks).float()
+    labels_all = torch.cat(label_chunks).float()
+
+    # ── Compute PLCC / MAE / RMSE on the device, SRCC (ranking) with scipy ────
+    diff = preds_all - labels_all
+    mae  = diff.abs().mean(dim=0)
+    rmse = diff.pow(2).mean(dim=0).sqrt()
+    preds_c  = preds_all - preds_all.mean(dim=0)
+    labels_c = labels_all - labels_all.mean(dim=0)
+    plcc = (preds_c * labels_c).sum(dim=0) / (preds_c.norm(dim=0) * labels_c.norm(dim=0))
+    plcc, mae, rmse = torch.stack([plcc, mae, rmse]).tolist()
+
+    preds_np  = preds_all.cpu().numpy()
+    labels_np = labels_all.cpu().numpy()
 
-    # ── Compute PLCC / SRCC ───────────────────────────────────────────────────
     print(f"\n{'='*60}")
     print(f"{'Attribute':<22} {'PLCC':>8} {'SRCC':>8} {'MAE':>8} {'RMSE':>8}")
     print(f"{'-'*60}")
 
     results = {}
-    for attr in ATTRIBUTES:
-        preds_arr  = np.array(all_preds[attr])
-        labels_arr = np.array(all_labels[attr])
-
-        plcc, _ = pearsonr(preds_arr, labels_arr)
-        srcc, _ = spearmanr(preds_arr, labels_arr)
-        mae  = float(np.mean(np.abs(preds_arr - labels_arr)))
-        rmse = float(np.sqrt(np.mean((preds_arr - labels_arr) ** 2)))
+    for i, attr in enumerate(ATTRIBUTES):
+        srcc, _ = spearmanr(preds_np[:, i], labels_np[:, i])
+        srcc = float(srcc)
 
-        results[attr] = {'plcc': plcc, 'srcc': srcc, 'mae': mae, 'rmse': rmse}
-        print(f"  {attr:<20} {plcc:>8.4f} {srcc:>8.4f} {mae:>8.2f} {rmse:>8.2f}")
+        results[attr] = {'plcc': plcc[i], 'srcc': srcc, 'mae': mae[i], 'rmse': rmse[i]}
+        print(f"  {attr:<20} {plcc[i]:>8.4f} {srcc:>8.4f} {mae[i]:>8.2f} {rmse[i]:>8.2f}")
 
     print(f"{'='*60}")
 
@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 from torchvision import models
 import json
+import pickle
 try:
     import timm
     TIMM_AVAILABLE = True
@@ -15,26 +16,29 @@ class PhotographyEvaluationModel(nn.Module):
     Supports CNN (ResNet, EfficientNet) and Transformer (ViT) backbones.
     """
     
-    def __init__(self, backbone='resnet50', pretrained=True, dropout_rate=0.5):
+    def __init__(self, backbone='resnet50', pretrained=True, dropout_rate=0.5, head_norm='batchnorm'):
         super().__init__()
         
         self.backbone_name = backbone
+        if head_norm not in ('batchnorm', 'layernorm'):
+            raise ValueError(f"Unsupported head_norm: {head_norm}. Use: batchnorm, layernorm")
+        self.head_norm = head_norm
         
         # Backbone selection (CNN or Transformer)
         if backbone == 'resnet50':
-            self.backbone = models.resnet50(pretrained=pretrained)
+            self.backbone = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 2048
         elif backbone == 'resnet34':
-            self.backbone = models.resnet34(pretrained=pretrained)
+            self.backbone = models.resnet34(weights=models.ResNet34_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 512
         elif backbone == 'resnet18':
-            self.backbone = models.resnet18(pretrained=pretrained)
+            self.backbone = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 512
         elif backbone == 'efficientnet_b0':
-            self.backbone = models.efficientnet_b0(pretrained=pretrained)
+            self.backbone = models.efficientnet_b0(weights=models.EfficientNet_B0_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.classifier = nn.Identity()
             backbone_features = 1280
         elif backbone.startswith('vit_'):
@@ -56,15 +60,17 @@ class PhotographyEvaluationModel(nn.Module):
     
     def _make_attribute_head(self, input_features, dropout_rate):
         """Create a regression head for one attribute."""
+        # LayerNorm has no running stats, so it behaves the same in train/eval and at batch size 1
+        norm = nn.LayerNorm if self.head_norm == 'layernorm' else nn.BatchNorm1d
         return nn.Sequential(
             nn.Dropout(dropout_rate),
             nn.Linear(input_features, 512),
-            nn.BatchNorm1d(512),
+            norm(512),
             nn.ReLU(inplace=True),
             
             nn.Dropout(dropout_rate / 2),
             nn.Linear(512, 256),
-            nn.BatchNorm1d(256),
+            norm(256),
             nn.ReLU(inplace=True),
             
             nn.Dropout(dropout_rate / 4),
@@ -92,14 +98,17 @@ class PhotographyEvaluationModel(nn.Module):
         if features.dim() > 2:
             features = torch.flatten(features, 1)
         
-        # Get predictions for each attribute (clamp to 0-100)
-        composition = torch.clamp(self.composition_head(features), 0, 100)
-        color = torch.clamp(self.color_head(features), 0, 100)
-        focus = torch.clamp(self.focus_head(features), 0, 100)
-        exposure = torch.clamp(self.exposure_head(features), 0, 100)
+        # Get predictions for each attribute (one clamp to 0-100 over all heads)
+        scores = torch.clamp(torch.cat([
+            self.composition_head(features),
+            self.color_head(features),
+            self.focus_head(features),
+            self.exposure_head(features)
+        ], dim=1), 0, 100)
+        composition, color, focus, exposure = scores.split(1, dim=1)
         
         # Calculate overall as average
-        overall = (composition + color + focus + exposure) / 4
+        overall = scores.mean(dim=1, keepdim=True)
         
         return {
             'composition_score': composition.squeeze(),
@@ -116,6 +125,7 @@ class PhotographyEvaluationModel(nn.Module):
         
         return {
             'backbone': self.backbone_name,
+            'head_norm': self.head_norm,
             'total_parameters': total_params,
             'trainable_parameters': trainable_params
         }
@@ -124,6 +134,8 @@ class PhotographyEvaluationModel(nn.Module):
 class MultiAttributeLoss(nn.Module):
     """Loss function for multi-attribute prediction."""
     
+    ATTRIBUTES = ['composition', 'color', 'focus', 'exposure', 'overall']
+    
     def __init__(self, weights=None):
         super().__init__()
         # Equal weights for all attributes by default
@@ -134,7 +146,10 @@ class MultiAttributeLoss(nn.Module):
             'exposure': 1.0,
             'overall': 0.5  # Lower weight since it's derived
         }
-        self.mse = nn.MSELoss()
+        self.register_buffer(
+            'weight_vector',
+            torch.tensor([self.weights[attr] for attr in self.ATTRIBUTES], dtype=torch.float32)
+        )
     
     def forward(self, predictions, targets):
         """
@@ -145,42 +160,83 @@ class MultiAttributeLoss(nn.Module):
             targets: dict with same keys
         
         Returns:
-            tuple: (total_loss, individual_losses_dict)
+            tuple: (total_loss, individual_losses_dict of detached 0-dim tensors)
         """
-        total_loss = 0
-        losses = {}
+        keys = [f'{attr}_score' for attr in self.ATTRIBUTES]
+        
+        # Stack attributes to (batch, 5) so all MSEs come from a single reduction
+        pred = torch.stack([predictions[k] for k in keys], dim=-1).reshape(-1, len(keys))
+        target = torch.stack([targets[k] for k in keys], dim=-1).reshape(-1, len(keys))
+        attr_losses = (pred.float() - target.float()).pow(2).mean(dim=0)
         
-        for attr in ['composition', 'color', 'focus', 'exposure', 'overall']:
-            attr_key = f'{attr}_score'
-            loss = self.mse(predictions[attr_key], targets[attr_key])
-            losses[attr_key] = loss.item()
-            total_loss += self.weights[attr] * loss
+        total_loss = (attr_losses * self.weight_vector).sum()
+        # Detached device tensors: callers accumulate without a host sync per batch
+        losses = dict(zip(keys, attr_losses.detach().unbind()))
         
         return total_loss, losses
 
 
-def create_model(backbone='resnet50', pretrained=True, device='cpu'):
+def load_checkpoint(path):
+    """
+    Load a checkpoint onto the CPU, memory-mapped (tensors are paged in from the
+    file as load_state_dict copies them) and without unpickling arbitrary objects.
+    
+    Falls back to a full, non-mmap load only for checkpoints in the legacy
+    (non-zip) serialization format or holding non-tensor objects; any other
+    error (missing or corrupt file) is raised as is.
+    """
+    try:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    except pickle.UnpicklingError as e:
+        reason = f"checkpoint holds objects weights_only cannot load ({str(e).splitlines()[0]})"
+    except RuntimeError as e:
+        if 'mmap can only be used with files saved with' not in str(e):
+            raise
+        reason = "checkpoint uses the legacy serialization format"
+    print(f"⚠️  Falling back to full checkpoint load: {reason}")
+    return torch.load(path, map_location='cpu', weights_only=False)
+
+
+def create_model(backbone='resnet50', pretrained=True, device='cpu', compile_mode=None, head_norm='batchnorm'):
     """
     Create model for training.
     
+    Args:
+        head_norm: normalization in the attribute heads ('batchnorm' or 'layernorm')
+        compile_mode: torch.compile mode ('default', 'reduce-overhead', 'max-autotune'),
+            or None to run eagerly
+    
     Returns:
         tuple: (model, criterion, model_info)
     """
     model = PhotographyEvaluationModel(
         backbone=backbone,
         pretrained=pretrained,
-        dropout_rate=0.5
+        dropout_rate=0.5,
+        head_norm=head_norm
     )
     
-    model = model.to(device)
-    criterion = MultiAttributeLoss()
+    # channels_last lets cuDNN pick NHWC (Tensor Core friendly) convolution kernels
+    model = model.to(device, memory_format=torch.channels_last)
+    criterion = MultiAttributeLoss().to(device)
     model_info = model.get_model_info()
     
+    # Compile in place (Module.compile) so state_dict keys stay unprefixed
+    # and checkpoints remain loadable by the eager inference service
+    if compile_mode:
+        if hasattr(model, 'compile'):
+            model.compile(mode=compile_mode)
+        else:
+            print("⚠️  torch.compile requires PyTorch >= 2.2, running eagerly")
+            compile_mode = None
+    
     print(f"Model created:")
     print(f"  Backbone: {backbone}")
+    print(f"  Head norm: {head_norm}")
     print(f"  Total parameters: {model_info['total_parameters']:,}")
     print(f"  Trainable parameters: {model_info['trainable_parameters']:,}")
     print(f"  Device: {device}")
+    print(f"  Compile mode: {compile_mode or 'eager'}")
     
     return model, criterion, model_info
 
@@ -0,0 +1,53 @@
+"""
+One-time AVA preprocessing for faster pretraining I/O.
+
+Two output formats:
+    tar  Packs the AVA jpgs into large uncompressed .tar shards so that training
+         memory-maps a few big files instead of opening ~255K small ones per epoch.
+    npy  Decodes and resizes every image once into a memory-mapped uint8
+         (N, 256, 256, 3) array, so training does no JPEG decoding at all
+         (~50 GB on disk for the full set).
+
+Usage:
+    cd ai-service
+    python preprocess_ava.py --format tar --images_dir <images> --output_dir <shards>
+    python train_ava.py --shards_dir <shards>
+
+    python preprocess_ava.py --format npy --images_dir <images> --output_dir <cache>
+    python train_ava.py --cache_dir <cache>
+"""
+
+import argparse
+from pathlib import Path
+
+from ava_dataset import parse_ava_txt, pack_ava_shards, build_ava_image_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocess AVA images for faster pretraining I/O')
+    parser.add_argument('--format',     type=str, default='tar', choices=['tar', 'npy'])
+    parser.add_argument('--ava_txt',    type=str, default=r'C:\Users\harold\Downloads\archive\AVA_Files\AVA.txt')
+    parser.add_argument('--images_dir', type=str, default=r'C:\Users\harold\Downloads\archive\images')
+    parser.add_argument('--output_dir', type=str, default=r'C:\Users\harold\Downloads\archive\shards')
+    parser.add_argument('--shard_size_mb', type=int, default=1024)
+    args = parser.parse_args()
+
+    print(f"Parsing AVA.txt from: {args.ava_txt}")
+    image_ids, _ = parse_ava_txt(args.ava_txt)
+
+    images_path = Path(args.images_dir)
+    print("Scanning images directory...")
+    available_ids = {p.stem for p in images_path.iterdir() if p.suffix.lower() == '.jpg'}
+    image_ids = [img_id for img_id in image_ids if img_id in available_ids]
+    print(f"  Preprocessing {len(image_ids):,} images")
+
+    if args.format == 'npy':
+        n_images = build_ava_image_cache(image_ids, images_path, args.output_dir)
+        print(f"✅ Cached {n_images:,} images to: {args.output_dir}")
+    else:
+        n_shards = pack_ava_shards(image_ids, images_path, args.output_dir, args.shard_size_mb)
+        print(f"✅ Wrote {n_shards} shards to: {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
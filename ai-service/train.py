@@ -1,17 +1,25 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import DistributedSampler
 from torch.optim.lr_scheduler import ReduceLROnPlateau, StepLR, CosineAnnealingLR, LinearLR, SequentialLR
 import argparse
+import contextlib
+import io
 import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import time
 from pathlib import Path
 from datetime import datetime
 from tqdm import tqdm
 import numpy as np
 
-from dataset import create_data_loaders
-from model import create_model, MultiAttributeLoss
+from dataset import create_data_loaders, get_gpu_transform, CUDAPrefetcher
+from model import create_model, load_checkpoint, MultiAttributeLoss
 
 
 def get_default_config(backbone='resnet50'):
@@ -33,15 +41,20 @@ def get_default_config(backbone='resnet50'):
         'epochs': 50,
         'batch_size': 16,
         'gradient_clip': 1.0,
+        'gradient_accumulation_steps': 1,  # micro-batches per optimizer step
         'warmup_epochs': 0,
         'warmup_start_factor': 0.1,
         'pretrained_backbone': None,  # path to AVA pretrained checkpoint
         'freeze_backbone_epochs': 0,   # freeze backbone for first N epochs (0 = never)
         'backbone_lr': None,           # lr for backbone after unfreezing (None = same as lr)
+        'mixed_precision': True,       # CUDA autocast: bf16 if supported, else fp16 + GradScaler
+        'compile_mode': None,          # torch.compile mode, CUDA only (None = eager)
+        'head_norm': 'batchnorm',      # 'batchnorm' or 'layernorm' in the attribute heads
         
         # Data
         'val_split': 0.15,
-        'num_workers': 4,
+        'num_workers': None,           # per process (None = max(4, cpu_count // 2), split across DDP processes)
+        'pin_memory': True,            # pinned batches make the non_blocking H2D copies async
         'random_seed': 42
     }
     
@@ -70,7 +83,21 @@ class Trainer:
     
     def __init__(self, config):
         self.config = config
+        self._setup_distributed()
+        if config.get('num_workers') is None:
+            # DDP runs one process (with its own workers) per rank, so share the CPUs
+            config['num_workers'] = max(1, max(4, (os.cpu_count() or 8) // 2) // self.world_size)
         self.device = self._setup_device()
+        if self.device.type == 'cuda':
+            # Input shape is fixed (224x224), so benchmark once and reuse the fastest
+            # cuDNN conv algorithms; allow TF32 for FP32 convs/matmuls on Ampere+
+            torch.backends.cudnn.benchmark = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.set_float32_matmul_precision('high')
+        self.amp_dtype = self._setup_mixed_precision()
+        # Loss scaling is only needed for fp16 (bf16 has fp32's exponent range)
+        self.scaler = torch.cuda.amp.GradScaler(enabled=self.amp_dtype == torch.float16)
         self.output_dir = Path(config['output_dir'])
         self.output_dir.mkdir(parents=True, exist_ok=True)
         
@@ -84,6 +111,10 @@ class Trainer:
         self.setup_optimizer()
         self.setup_scheduler()
         
+        # Checkpoints are written by one background thread (at most one save in flight)
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_save = None
+        
         # Training state
         self.current_epoch = 0
         self.best_val_loss = float('inf')
@@ -91,58 +122,135 @@ class Trainer:
         self.val_losses = []
         
         # Save config
-        with open(self.output_dir / 'config.json', 'w') as f:
-            json.dump(config, f, indent=2)
-        
-        print(f"\n{'='*60}")
-        print(f"Trainer initialized")
-        print(f"Output directory: {self.output_dir}")
-        print(f"Device: {self.device}")
-        print(f"{'='*60}\n")
+        if self.is_main_process:
+            with open(self.output_dir / 'config.json', 'w') as f:
+                json.dump(config, f, indent=2)
+        
+        self.log(f"\n{'='*60}")
+        self.log(f"Trainer initialized")
+        self.log(f"Output directory: {self.output_dir}")
+        self.log(f"Device: {self.device}")
+        if self.distributed:
+            self.log(f"Distributed: {self.world_size} processes (batch size {self.config['batch_size']} per process)")
+        self.log(f"{'='*60}\n")
+    
+    def _setup_distributed(self):
+        """
+        Join the DDP process group when launched by torchrun (WORLD_SIZE > 1),
+        e.g. torchrun --nproc_per_node=4 train.py ...
+        
+        Uses NCCL on CUDA and Gloo otherwise. Only rank 0 logs and writes files.
+        """
+        self.world_size = int(os.environ.get('WORLD_SIZE', 1))
+        self.distributed = self.world_size > 1
+        self.local_rank = int(os.environ.get('LOCAL_RANK', 0))
+        if self.distributed:
+            if torch.cuda.is_available():
+                torch.cuda.set_device(self.local_rank)
+            dist.init_process_group('nccl' if torch.cuda.is_available() else 'gloo')
+            self.rank = dist.get_rank()
+        else:
+            self.rank = 0
+        self.is_main_process = self.rank == 0
+    
+    def log(self, *args, **kwargs):
+        """print() on the main process only (all DDP ranks run the same code)."""
+        if self.is_main_process:
+            print(*args, **kwargs)
+    
+    def _quiet(self):
+        """Drop stdout from the dataset/model helpers on non-main DDP ranks."""
+        if self.is_main_process:
+            return contextlib.nullcontext()
+        return contextlib.redirect_stdout(io.StringIO())
     
     def _setup_device(self):
         """Setup compute device (MPS/CUDA/CPU)."""
-        if torch.backends.mps.is_available():
+        if self.distributed:
+            # One process per GPU (or CPU processes with Gloo)
+            if torch.cuda.is_available():
+                device = torch.device('cuda', self.local_rank)
+                self.log(f"✅ Using CUDA GPU {self.local_rank}: {torch.cuda.get_device_name(self.local_rank)}")
+            else:
+                device = torch.device('cpu')
+                self.log("⚠️  Using CPU (training will be slow)")
+        elif torch.backends.mps.is_available():
             device = torch.device('mps')
-            print("✅ Using Apple Silicon GPU (MPS)")
+            self.log("✅ Using Apple Silicon GPU (MPS)")
         elif torch.cuda.is_available():
             device = torch.device('cuda')
-            print(f"✅ Using CUDA GPU: {torch.cuda.get_device_name(0)}")
+            self.log(f"✅ Using CUDA GPU: {torch.cuda.get_device_name(0)}")
         else:
             device = torch.device('cpu')
-            print("⚠️  Using CPU (training will be slow)")
+            self.log("⚠️  Using CPU (training will be slow)")
         return device
     
+    def _setup_mixed_precision(self):
+        """Pick the autocast dtype (None = full FP32)."""
+        if not self.config.get('mixed_precision', True) or self.device.type != 'cuda':
+            return None
+        if torch.cuda.is_bf16_supported():
+            self.log("✅ Mixed precision: bf16 autocast")
+            return torch.bfloat16
+        self.log("✅ Mixed precision: fp16 autocast + GradScaler")
+        return torch.float16
+    
+    def _autocast(self):
+        """Autocast context for forward + loss (no-op when running in FP32)."""
+        if self.amp_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.amp_dtype)
+    
     def setup_data_loaders(self):
         """Setup AADB data loaders."""
-        print("Setting up AADB data loaders...")
-        
-        self.train_loader, self.val_loader, self.test_loader, self.split_info = create_data_loaders(
-            train_labels_path=self.config['train_labels_path'],
-            test_labels_path=self.config['test_labels_path'],
-            images_path=self.config['images_path'],
-            batch_size=self.config['batch_size'],
-            num_workers=self.config['num_workers'],
-            val_split=self.config['val_split']
-        )
+        self.log("Setting up AADB data loaders...")
+        
+        with self._quiet():
+            self.train_loader, self.val_loader, self.test_loader, self.split_info = create_data_loaders(
+                train_labels_path=self.config['train_labels_path'],
+                test_labels_path=self.config['test_labels_path'],
+                images_path=self.config['images_path'],
+                batch_size=self.config['batch_size'],
+                num_workers=self.config['num_workers'],
+                val_split=self.config['val_split'],
+                pin_memory=self.config.get('pin_memory', True),
+                distributed=self.distributed
+            )
+        # uint8 -> normalized float32, applied to whole batches on the device
+        # (the train variant also runs the augmentations when kornia is installed)
+        self.train_gpu_transform = get_gpu_transform(train=True)
+        self.gpu_transform = get_gpu_transform()
     
     def setup_model(self):
         """Setup model and loss function."""
-        print("\nSetting up model...")
+        self.log("\nSetting up model...")
         
-        self.model, self.criterion, self.model_info = create_model(
-            backbone=self.config['backbone'],
-            pretrained=self.config['pretrained'],
-            device=self.device
-        )
+        # AVA-pretrained backbone weights replace the ImageNet ones, so skip the
+        # ImageNet weight download/hash when a backbone checkpoint is given
+        pretrained_backbone = self.config.get('pretrained_backbone')
+        ckpt_path = Path(pretrained_backbone) if pretrained_backbone else None
+        load_backbone = ckpt_path is not None and ckpt_path.exists()
+        
+        # Inductor needs CUDA (+ Triton); MPS and CPU runs stay eager
+        compile_mode = self.config.get('compile_mode')
+        if compile_mode and self.device.type != 'cuda':
+            self.log(f"⚠️  Skipping torch.compile ({compile_mode}) on {self.device.type}")
+            compile_mode = None
+        
+        with self._quiet():
+            self.model, self.criterion, self.model_info = create_model(
+                backbone=self.config['backbone'],
+                pretrained=self.config['pretrained'] and not load_backbone,
+                device=self.device,
+                compile_mode=compile_mode,
+                head_norm=self.config.get('head_norm', 'batchnorm')
+            )
 
         # Load AVA-pretrained backbone weights if provided
-        pretrained_backbone = self.config.get('pretrained_backbone')
-        if pretrained_backbone:
-            ckpt_path = Path(pretrained_backbone)
-            if ckpt_path.exists():
-                print(f"Loading AVA pretrained backbone from: {ckpt_path}")
-                checkpoint = torch.load(ckpt_path, map_location=self.device)
+        if ckpt_path is not None:
+            if load_backbone:
+                self.log(f"Loading AVA pretrained backbone from: {ckpt_path}")
+                checkpoint = load_checkpoint(ckpt_path)
                 # Checkpoint may store backbone weights directly or inside model_state_dict
                 if 'backbone_state_dict' in checkpoint:
                     missing, unexpected = self.model.backbone.load_state_dict(
@@ -160,9 +268,9 @@ class Trainer:
                     missing, unexpected = self.model.backbone.load_state_dict(
                         checkpoint, strict=False
                     )
-                print(f"  Backbone loaded  |  missing={len(missing)}  unexpected={len(unexpected)}")
+                self.log(f"  Backbone loaded  |  missing={len(missing)}  unexpected={len(unexpected)}")
             else:
-                print(f"⚠️  pretrained_backbone path not found: {ckpt_path}")
+                self.log(f"⚠️  pretrained_backbone path not found: {ckpt_path}")
         
         # Freeze backbone for first N epochs if requested
         freeze_epochs = int(self.config.get('freeze_backbone_epochs', 0) or 0)
@@ -170,11 +278,28 @@ class Trainer:
             for param in self.model.backbone.parameters():
                 param.requires_grad = False
             trainable = sum(p.numel() for p in self.model.parameters() if p.requires_grad)
-            print(f"  Backbone frozen for first {freeze_epochs} epochs  |  trainable params: {trainable:,}")
+            self.log(f"  Backbone frozen for first {freeze_epochs} epochs  |  trainable params: {trainable:,}")
+        
+        # Gradient all-reduce wrapper for training; self.model stays the raw module
+        # (checkpoints, backbone freezing and eval all use it directly)
+        self._wrap_model()
         
         # Save model info
-        with open(self.output_dir / 'model_info.json', 'w') as f:
-            json.dump(self.model_info, f, indent=2)
+        if self.is_main_process:
+            with open(self.output_dir / 'model_info.json', 'w') as f:
+                json.dump(self.model_info, f, indent=2)
+    
+    def _wrap_model(self):
+        """Set self.forward_model: DDP around self.model when distributed, else the model itself."""
+        if not self.distributed:
+            self.forward_model = self.model
+            return
+        # DDP only registers parameters that require grad, so this is redone after unfreezing
+        self.forward_model = DDP(
+            self.model,
+            device_ids=[self.device.index] if self.device.type == 'cuda' else None,
+            gradient_as_bucket_view=True
+        )
     
     def _build_param_groups(self):
         """Build optimizer parameter groups with optional differential lr for backbone."""
@@ -223,9 +348,9 @@ class Trainer:
         
         backbone_lr = self.config.get('backbone_lr')
         if backbone_lr and not (not any(p.requires_grad for p in self.model.backbone.parameters())):
-            print(f"Optimizer: {self.config['optimizer']} (backbone_lr={backbone_lr}, head_lr={self.config['learning_rate']}, wd={self.config['weight_decay']})")
+            self.log(f"Optimizer: {self.config['optimizer']} (backbone_lr={backbone_lr}, head_lr={self.config['learning_rate']}, wd={self.config['weight_decay']})")
         else:
-            print(f"Optimizer: {self.config['optimizer']} (lr={self.config['learning_rate']}, wd={self.config['weight_decay']})")
+            self.log(f"Optimizer: {self.config['optimizer']} (lr={self.config['learning_rate']}, wd={self.config['weight_decay']})")
     
     def setup_scheduler(self):
         """Setup learning rate scheduler."""
@@ -247,7 +372,7 @@ class Trainer:
             )
         elif self.config['scheduler'] == 'cosine':
             if warmup_start_factor <= 0 or warmup_start_factor > 1:
-                print(f"⚠️  Invalid warmup_start_factor={warmup_start_factor}. Resetting to 0.1")
+                self.log(f"⚠️  Invalid warmup_start_factor={warmup_start_factor}. Resetting to 0.1")
                 warmup_start_factor = 0.1
 
             max_warmup = max(self.config['epochs'] - 1, 0)
@@ -271,7 +396,7 @@ class Trainer:
                     schedulers=[warmup_scheduler, cosine_scheduler],
                     milestones=[effective_warmup]
                 )
-                print(f"Warmup: {effective_warmup} epochs (start_factor={warmup_start_factor})")
+                self.log(f"Warmup: {effective_warmup} epochs (start_factor={warmup_start_factor})")
             else:
                 self.scheduler = CosineAnnealingLR(
                     self.optimizer,
@@ -281,17 +406,18 @@ class Trainer:
         else:
             self.scheduler = None
         
-        print(f"Scheduler: {self.config['scheduler']}")
+        self.log(f"Scheduler: {self.config['scheduler']}")
 
     def unfreeze_backbone(self):
         """Unfreeze backbone and rebuild optimizer/scheduler with differential lr."""
-        print(f"\n{'='*60}")
-        print(f"Unfreezing backbone at epoch {self.current_epoch + 1}")
+        self.log(f"\n{'='*60}")
+        self.log(f"Unfreezing backbone at epoch {self.current_epoch + 1}")
         for param in self.model.backbone.parameters():
             param.requires_grad = True
         total = sum(p.numel() for p in self.model.parameters())
         trainable = sum(p.numel() for p in self.model.parameters() if p.requires_grad)
-        print(f"  Trainable params: {trainable:,} / {total:,}")
+        self.log(f"  Trainable params: {trainable:,} / {total:,}")
+        self._wrap_model()
 
         # Rebuild optimizer with param groups
         backbone_lr = self.config.get('backbone_lr') or self.config['learning_rate']
@@ -303,145 +429,203 @@ class Trainer:
             self.optimizer = optim.AdamW(param_groups, lr=base_lr, weight_decay=self.config['weight_decay'])
         elif self.config['optimizer'] == 'sgd':
             self.optimizer = optim.SGD(param_groups, lr=base_lr, momentum=0.9, weight_decay=self.config['weight_decay'])
-        print(f"  Optimizer rebuilt  |  backbone_lr={backbone_lr}  head_lr={self.config['learning_rate']}")
+        self.log(f"  Optimizer rebuilt  |  backbone_lr={backbone_lr}  head_lr={self.config['learning_rate']}")
 
         # Rebuild scheduler for remaining epochs
         remaining = self.config['epochs'] - self.current_epoch
         if self.config['scheduler'] == 'cosine':
             self.scheduler = CosineAnnealingLR(self.optimizer, T_max=max(remaining, 1), eta_min=1e-6)
-            print(f"  Scheduler rebuilt  |  cosine over {remaining} remaining epochs")
+            self.log(f"  Scheduler rebuilt  |  cosine over {remaining} remaining epochs")
         elif self.config['scheduler'] == 'reduce_on_plateau':
             self.scheduler = ReduceLROnPlateau(self.optimizer, mode='min', factor=0.5, patience=5)
-        print(f"{'='*60}\n")
+        self.log(f"{'='*60}\n")
 
     def train_epoch(self):
         """Train for one epoch."""
         self.model.train()
         
-        total_loss = 0
+        # Running sums stay on the device; read back every log_every batches
+        total_loss = torch.zeros((), device=self.device)
         attr_losses = {
-            'composition_score': 0,
-            'color_score': 0,
-            'focus_score': 0,
-            'exposure_score': 0,
-            'overall_score': 0
+            'composition_score': torch.zeros((), device=self.device),
+            'color_score': torch.zeros((), device=self.device),
+            'focus_score': torch.zeros((), device=self.device),
+            'exposure_score': torch.zeros((), device=self.device),
+            'overall_score': torch.zeros((), device=self.device)
         }
         
-        pbar = tqdm(self.train_loader, desc=f"Epoch {self.current_epoch + 1}/{self.config['epochs']} [Train]")
+        # Reshuffle the per-rank shards every epoch
+        if isinstance(self.train_loader.sampler, DistributedSampler):
+            self.train_loader.sampler.set_epoch(self.current_epoch)
         
-        for batch_idx, (images, targets, metadata) in enumerate(pbar):
-            # Move to device
-            images = images.to(self.device)
-            targets = {k: v.to(self.device) for k, v in targets.items()}
-            
-            # Forward pass
-            self.optimizer.zero_grad()
-            predictions = self.model(images)
-            loss, losses = self.criterion(predictions, targets)
-            
-            # Backward pass
-            loss.backward()
+        n_batches = len(self.train_loader)
+        accum_steps = max(1, int(self.config.get('gradient_accumulation_steps', 1) or 1))
+        # A short last group (n_batches not a multiple of accum_steps) is averaged over its own size
+        tail_start = n_batches - (n_batches % accum_steps or accum_steps)
+        log_every = max(1, n_batches // 50)
+        pbar = tqdm(CUDAPrefetcher(self.train_loader, self.device),
+                    desc=f"Epoch {self.current_epoch + 1}/{self.config['epochs']} [Train]",
+                    disable=not self.is_main_process)
+        
+        self.optimizer.zero_grad(set_to_none=True)
+        for batch_idx, (images, targets) in enumerate(pbar):
+            # Batches arrive on the device (channels_last); uint8 -> normalized float
+            images = self.train_gpu_transform(images)
+            is_step = (batch_idx + 1) % accum_steps == 0 or batch_idx + 1 == n_batches
+            group_size = accum_steps if batch_idx < tail_start else n_batches - tail_start
             
-            # Gradient clipping
-            if self.config['gradient_clip'] > 0:
-                torch.nn.utils.clip_grad_norm_(
-                    self.model.parameters(),
-                    self.config['gradient_clip']
-                )
+            # Micro-batches that only accumulate skip DDP's gradient all-reduce
+            sync_ctx = (self.forward_model.no_sync() if self.distributed and not is_step
+                        else contextlib.nullcontext())
+            with sync_ctx:
+                # Forward pass
+                with self._autocast():
+                    predictions = self.forward_model(images)
+                    loss, losses = self.criterion(predictions, targets)
+                
+                # Backward pass (scaler is a pass-through unless training in fp16)
+                self.scaler.scale(loss / group_size).backward()
             
-            self.optimizer.step()
+            if is_step:
+                # Gradient clipping (on unscaled gradients)
+                if self.config['gradient_clip'] > 0:
+                    self.scaler.unscale_(self.optimizer)
+                    torch.nn.utils.clip_grad_norm_(
+                        self.model.parameters(),
+                        self.config['gradient_clip']
+                    )
+                
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
+                self.optimizer.zero_grad(set_to_none=True)
             
-            # Accumulate losses
-            total_loss += loss.item()
+            # Accumulate losses (no host sync)
+            total_loss += loss.detach()
             for key in attr_losses:
                 attr_losses[key] += losses[key]
             
-            # Update progress bar
-            pbar.set_postfix({
-                'loss': f"{loss.item():.4f}",
-                'comp': f"{losses['composition_score']:.4f}",
-                'color': f"{losses['color_score']:.4f}"
-            })
-        
-        # Calculate average losses
-        n_batches = len(self.train_loader)
-        avg_loss = total_loss / n_batches
-        avg_attr_losses = {k: v / n_batches for k, v in attr_losses.items()}
+            # Update progress bar with running averages (one host transfer)
+            if (batch_idx + 1) % log_every == 0:
+                loss_avg, comp_avg, color_avg = (
+                    torch.stack([total_loss, attr_losses['composition_score'], attr_losses['color_score']])
+                    / (batch_idx + 1)
+                ).tolist()
+                pbar.set_postfix({
+                    'loss': f"{loss_avg:.4f}",
+                    'comp': f"{comp_avg:.4f}",
+                    'color': f"{color_avg:.4f}"
+                })
         
-        return avg_loss, avg_attr_losses
+        return self._average_losses(total_loss, attr_losses, n_batches)
     
     def validate_epoch(self):
         """Validate for one epoch."""
         self.model.eval()
         
-        total_loss = 0
+        # Running sums stay on the device; read back every log_every batches
+        total_loss = torch.zeros((), device=self.device)
         attr_losses = {
-            'composition_score': 0,
-            'color_score': 0,
-            'focus_score': 0,
-            'exposure_score': 0,
-            'overall_score': 0
+            'composition_score': torch.zeros((), device=self.device),
+            'color_score': torch.zeros((), device=self.device),
+            'focus_score': torch.zeros((), device=self.device),
+            'exposure_score': torch.zeros((), device=self.device),
+            'overall_score': torch.zeros((), device=self.device)
         }
         
-        with torch.no_grad():
-            pbar = tqdm(self.val_loader, desc=f"Epoch {self.current_epoch + 1}/{self.config['epochs']} [Val]")
+        with torch.inference_mode():
+            log_every = max(1, len(self.val_loader) // 50)
+            pbar = tqdm(CUDAPrefetcher(self.val_loader, self.device),
+                        desc=f"Epoch {self.current_epoch + 1}/{self.config['epochs']} [Val]",
+                        disable=not self.is_main_process)
             
-            for images, targets, metadata in pbar:
-                # Move to device
-                images = images.to(self.device)
-                targets = {k: v.to(self.device) for k, v in targets.items()}
+            for batch_idx, (images, targets) in enumerate(pbar):
+                # Batches arrive on the device (channels_last); uint8 -> normalized float
+                images = self.gpu_transform(images)
                 
                 # Forward pass
-                predictions = self.model(images)
-                loss, losses = self.criterion(predictions, targets)
+                with self._autocast():
+                    predictions = self.model(images)
+                    loss, losses = self.criterion(predictions, targets)
                 
-                # Accumulate losses
-                total_loss += loss.item()
+                # Accumulate losses (no host sync)
+                total_loss += loss
                 for key in attr_losses:
                     attr_losses[key] += losses[key]
                 
-                # Update progress bar
-                pbar.set_postfix({
-                    'loss': f"{loss.item():.4f}"
-                })
-        
-        # Calculate average losses
-        n_batches = len(self.val_loader)
-        avg_loss = total_loss / n_batches
-        avg_attr_losses = {k: v / n_batches for k, v in attr_losses.items()}
+                # Update progress bar with the running average
+                if (batch_idx + 1) % log_every == 0:
+                    pbar.set_postfix({
+                        'loss': f"{total_loss.item() / (batch_idx + 1):.4f}"
+                    })
         
+        return self._average_losses(total_loss, attr_losses, len(self.val_loader))
+    
+    def _average_losses(self, total_loss, attr_losses, n_batches):
+        """Per-batch averages of the on-device loss sums, in one host transfer."""
+        sums = torch.stack([total_loss, *attr_losses.values()])
+        if self.distributed:
+            # Average over all ranks' shards (DistributedSampler gives each rank the same batch count)
+            dist.all_reduce(sums)
+            n_batches *= self.world_size
+        sums = sums.tolist()
+        avg_loss = sums[0] / n_batches
+        avg_attr_losses = {k: v / n_batches for k, v in zip(attr_losses, sums[1:])}
         return avg_loss, avg_attr_losses
     
+    def _log_metrics(self, metrics):
+        """Append one epoch's metrics to output_dir/metrics.jsonl (rank 0 only)."""
+        if not self.is_main_process:
+            return
+        with open(self.metrics_path, 'a') as f:
+            f.write(json.dumps(metrics) + '\n')
+    
     def save_checkpoint(self, is_best=False):
-        """Save model checkpoint."""
+        """Save model checkpoint (rank 0 only when distributed)."""
+        if not self.is_main_process:
+            return
+        
+        # Previous save must finish before its files are overwritten
+        self.wait_for_checkpoint()
+        
+        # Snapshot to CPU now so training can keep updating the live tensors
         checkpoint = {
             'epoch': self.current_epoch,
-            'model_state_dict': self.model.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
+            'model_state_dict': _to_cpu(self.model.state_dict()),
+            'optimizer_state_dict': _to_cpu(self.optimizer.state_dict()),
             'best_val_loss': self.best_val_loss,
-            'train_losses': self.train_losses,
-            'val_losses': self.val_losses,
-            'config': self.config
+            'train_losses': list(self.train_losses),
+            'val_losses': list(self.val_losses),
+            'config': dict(self.config)
         }
         
-        # Save latest checkpoint
+        # Latest checkpoint, copied to best_model.pth when it is the best so far
         checkpoint_path = self.output_dir / 'latest_checkpoint.pth'
-        torch.save(checkpoint, checkpoint_path)
-        
-        # Save best model
+        best_path = self.output_dir / 'best_model.pth' if is_best else None
+        self._pending_save = self._save_executor.submit(
+            _write_checkpoint, checkpoint, checkpoint_path, best_path
+        )
         if is_best:
-            best_path = self.output_dir / 'best_model.pth'
-            torch.save(checkpoint, best_path)
-            print(f"✅ Best model saved! Val Loss: {self.best_val_loss:.4f}")
+            self.log(f"✅ Best model saved! Val Loss: {self.best_val_loss:.4f}")
+    
+    def wait_for_checkpoint(self):
+        """Block until the in-flight background checkpoint save (if any) is on disk."""
+        if self._pending_save is not None:
+            self._pending_save.result()
+            self._pending_save = None
     
     def train(self):
         """Main training loop."""
-        print(f"\n{'='*60}")
-        print(f"Starting training for {self.config['epochs']} epochs")
-        print(f"{'='*60}\n")
+        self.log(f"\n{'='*60}")
+        self.log(f"Starting training for {self.config['epochs']} epochs")
+        self.log(f"{'='*60}\n")
         
         start_time = time.time()
         
+        # One JSON line per epoch; plots are rendered from it outside the training process
+        self.metrics_path = self.output_dir / 'metrics.jsonl'
+        if self.is_main_process:
+            self.metrics_path.write_text('')
+        
         freeze_epochs = int(self.config.get('freeze_backbone_epochs', 0) or 0)
 
         for epoch in range(self.config['epochs']):
@@ -467,17 +651,17 @@ class Trainer:
                     self.scheduler.step()
             
             # Print epoch summary
-            print(f"\nEpoch {epoch + 1}/{self.config['epochs']} Summary:")
-            print(f"  Train Loss: {train_loss:.4f}")
-            print(f"    Composition: {train_attr_losses['composition_score']:.4f}")
-            print(f"    Color: {train_attr_losses['color_score']:.4f}")
-            print(f"    Focus: {train_attr_losses['focus_score']:.4f}")
-            print(f"    Exposure: {train_attr_losses['exposure_score']:.4f}")
-            print(f"  Val Loss: {val_loss:.4f}")
-            print(f"    Composition: {val_attr_losses['composition_score']:.4f}")
-            print(f"    Color: {val_attr_losses['color_score']:.4f}")
-            print(f"    Focus: {val_attr_losses['focus_score']:.4f}")
-            print(f"    Exposure: {val_attr_losses['exposure_score']:.4f}")
+            self.log(f"\nEpoch {epoch + 1}/{self.config['epochs']} Summary:")
+            self.log(f"  Train Loss: {train_loss:.4f}")
+            self.log(f"    Composition: {train_attr_losses['composition_score']:.4f}")
+            self.log(f"    Color: {train_attr_losses['color_score']:.4f}")
+            self.log(f"    Focus: {train_attr_losses['focus_score']:.4f}")
+            self.log(f"    Exposure: {train_attr_losses['exposure_score']:.4f}")
+            self.log(f"  Val Loss: {val_loss:.4f}")
+            self.log(f"    Composition: {val_attr_losses['composition_score']:.4f}")
+            self.log(f"    Color: {val_attr_losses['color_score']:.4f}")
+            self.log(f"    Focus: {val_attr_losses['focus_score']:.4f}")
+            self.log(f"    Exposure: {val_attr_losses['exposure_score']:.4f}")
             
             # Save checkpoint
             is_best = val_loss < self.best_val_loss
@@ -485,17 +669,49 @@ class Trainer:
                 self.best_val_loss = val_loss
             
             self.save_checkpoint(is_best=is_best)
+            self._log_metrics({
+                'epoch': epoch + 1,
+                'train_loss': train_loss,
+                'val_loss': val_loss,
+                **{f'train_{k}': v for k, v in train_attr_losses.items()},
+                **{f'val_{k}': v for k, v in val_attr_losses.items()},
+                'lr': [group['lr'] for group in self.optimizer.param_groups],
+                'is_best': is_best
+            })
             
-            print()
+            self.log()
         
         # Training complete
+        self.wait_for_checkpoint()
+        self._save_executor.shutdown()
         total_time = time.time() - start_time
-        print(f"\n{'='*60}")
-        print(f"Training Complete!")
-        print(f"Total time: {total_time / 3600:.2f} hours")
-        print(f"Best validation loss: {self.best_val_loss:.4f}")
-        print(f"Model saved to: {self.output_dir / 'best_model.pth'}")
-        print(f"{'='*60}\n")
+        self.log(f"\n{'='*60}")
+        self.log(f"Training Complete!")
+        self.log(f"Total time: {total_time / 3600:.2f} hours")
+        self.log(f"Best validation loss: {self.best_val_loss:.4f}")
+        self.log(f"Model saved to: {self.output_dir / 'best_model.pth'}")
+        self.log(f"{'='*60}\n")
+        
+        if self.distributed:
+            dist.destroy_process_group()
+
+
+def _to_cpu(obj):
+    """Copy every tensor in a (nested) state dict to CPU memory."""
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+
+def _write_checkpoint(checkpoint, checkpoint_path, best_path=None):
+    """Serialize a checkpoint (runs on the background save thread)."""
+    torch.save(checkpoint, checkpoint_path)
+    if best_path is not None:
+        shutil.copyfile(checkpoint_path, best_path)
 
 
 def main():
@@ -521,6 +737,17 @@ def main():
                         help='Freeze backbone for first N epochs, then unfreeze with backbone_lr')
     parser.add_argument('--backbone_lr', type=float, default=None,
                         help='LR for backbone after unfreezing (default: same as --lr)')
+    parser.add_argument('--no_mixed_precision', action='store_true',
+                        help='Disable bf16/fp16 autocast and train in full FP32')
+    parser.add_argument('--compile_mode', type=str, default=None,
+                        choices=['default', 'reduce-overhead', 'max-autotune', 'none'],
+                        help='torch.compile mode on CUDA (default: eager; needs Triton, not available on Windows)')
+    parser.add_argument('--head_norm', type=str, default=None, choices=['batchnorm', 'layernorm'],
+                        help='Normalization layer in the attribute heads')
+    parser.add_argument('--gradient_accumulation_steps', type=int, default=None,
+                        help='Accumulate gradients over N batches per optimizer step')
+    parser.add_argument('--num_workers', type=int, default=None,
+                        help='DataLoader workers per process (default: max(4, cpu_count // 2), split across DDP processes)')
     
     args = parser.parse_args()
     
@@ -552,26 +779,42 @@ def main():
         config['freeze_backbone_epochs'] = max(args.freeze_backbone_epochs, 0)
     if args.backbone_lr is not None:
         config['backbone_lr'] = args.backbone_lr
-    
-    # Print configuration
-    print(f"\n{'='*60}")
-    print(f"Training Configuration:")
-    print(f"  Backbone: {config['backbone']}")
-    print(f"  Optimizer: {config['optimizer']}")
-    print(f"  Scheduler: {config['scheduler']}")
-    print(f"  Warmup Epochs: {config.get('warmup_epochs', 0)}")
-    print(f"  Warmup Start Factor: {config.get('warmup_start_factor', 0.1)}")
-    print(f"  Pretrained Backbone: {config.get('pretrained_backbone') or 'ImageNet only'}")
-    print(f"  Freeze Backbone Epochs: {config.get('freeze_backbone_epochs', 0)}")
-    print(f"  Backbone LR (after unfreeze): {config.get('backbone_lr') or 'same as lr'}")
-    print(f"  Learning Rate: {config['learning_rate']}")
-    print(f"  Weight Decay: {config['weight_decay']}")
-    print(f"  Epochs: {config['epochs']}")
-    print(f"  Batch Size: {config['batch_size']}")
-    print(f"{'='*60}\n")
+    if args.no_mixed_precision:
+        config['mixed_precision'] = False
+    if args.compile_mode is not None:
+        config['compile_mode'] = None if args.compile_mode == 'none' else args.compile_mode
+    if args.head_norm is not None:
+        config['head_norm'] = args.head_norm
+    if args.num_workers is not None:
+        config['num_workers'] = max(args.num_workers, 0)
+    if args.gradient_accumulation_steps is not None:
+        config['gradient_accumulation_steps'] = max(args.gradient_accumulation_steps, 1)
     
     # Create trainer and train
     trainer = Trainer(config)
+    
+    # Print configuration (num_workers is resolved per process by the Trainer)
+    trainer.log(f"\n{'='*60}")
+    trainer.log(f"Training Configuration:")
+    trainer.log(f"  Backbone: {config['backbone']}")
+    trainer.log(f"  Head Norm: {config['head_norm']}")
+    trainer.log(f"  Optimizer: {config['optimizer']}")
+    trainer.log(f"  Scheduler: {config['scheduler']}")
+    trainer.log(f"  Warmup Epochs: {config.get('warmup_epochs', 0)}")
+    trainer.log(f"  Warmup Start Factor: {config.get('warmup_start_factor', 0.1)}")
+    trainer.log(f"  Pretrained Backbone: {config.get('pretrained_backbone') or 'ImageNet only'}")
+    trainer.log(f"  Freeze Backbone Epochs: {config.get('freeze_backbone_epochs', 0)}")
+    trainer.log(f"  Backbone LR (after unfreeze): {config.get('backbone_lr') or 'same as lr'}")
+    trainer.log(f"  Learning Rate: {config['learning_rate']}")
+    trainer.log(f"  Weight Decay: {config['weight_decay']}")
+    trainer.log(f"  Epochs: {config['epochs']}")
+    trainer.log(f"  Batch Size: {config['batch_size']}")
+    trainer.log(f"  Gradient Accumulation Steps: {config['gradient_accumulation_steps']}")
+    trainer.log(f"  Num Workers: {config['num_workers']}")
+    trainer.log(f"  Mixed Precision: {config['mixed_precision']}")
+    trainer.log(f"  Compile Mode: {config['compile_mode'] or 'eager'}")
+    trainer.log(f"{'='*60}\n")
+    
     trainer.train()
 
 if __name__ == "__main__":
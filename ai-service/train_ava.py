@@ -30,6 +30,7 @@ from torchvision import models
 from tqdm import tqdm
 
 from ava_dataset import create_ava_data_loaders
+from dataset import get_gpu_transform, CUDAPrefetcher
 
 
 # ---------------------------------------------------------------------------
@@ -47,12 +48,12 @@ class AVAScoreModel(nn.Module):
         self.backbone_name = backbone
 
         if backbone == 'resnet50':
-            base = models.resnet50(pretrained=pretrained)
+            base = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1 if pretrained else None)
             base.fc = nn.Identity()
             self.backbone = base
             feat_dim = 2048
         elif backbone == 'resnet34':
-            base = models.resnet34(pretrained=pretrained)
+            base = models.resnet34(weights=models.ResNet34_Weights.IMAGENET1K_V1 if pretrained else None)
             base.fc = nn.Identity()
             self.backbone = base
             feat_dim = 512
@@ -82,6 +83,12 @@ class AVATrainer:
     def __init__(self, config):
         self.config = config
         self.device = self._setup_device()
+        if self.device.type == 'cuda':
+            # Fixed 224x224 inputs: benchmark cuDNN conv algorithms once; TF32 on Ampere+
+            torch.backends.cudnn.benchmark = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.set_float32_matmul_precision('high')
         self.output_dir = Path(config['output_dir'])
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -97,9 +104,13 @@ class AVATrainer:
             num_workers=config['num_workers'],
             val_split=config['val_split'],
             random_seed=config['random_seed'],
+            shards_path=config.get('shards_path'),
+            cache_path=config.get('cache_path'),
         )
         with open(self.output_dir / 'split_info.json', 'w') as f:
             json.dump(self.split_info, f, indent=2)
+        # uint8 -> normalized float32, applied to whole batches on the device
+        self.gpu_transform = get_gpu_transform()
 
         # Model
         print(f"\nBuilding {config['backbone']} model...")
@@ -173,19 +184,21 @@ class AVATrainer:
 
     def _run_epoch(self, loader, train=True):
         self.model.train() if train else self.model.eval()
-        total_loss = 0.0
+        # Running sum stays on the device; read back every log_every batches
+        total_loss = torch.zeros((), device=self.device)
+        log_every = max(1, len(loader) // 50)
         mode = "Train" if train else "Val"
         epoch_str = f"{self.current_epoch + 1}/{self.config['epochs']}"
 
-        ctx = torch.enable_grad() if train else torch.no_grad()
+        ctx = torch.enable_grad() if train else torch.inference_mode()
         with ctx:
-            pbar = tqdm(loader, desc=f"Epoch {epoch_str} [{mode}]", leave=False)
-            for images, targets in pbar:
-                images = images.to(self.device, non_blocking=True)
-                targets = targets.to(self.device, non_blocking=True)
+            batches = CUDAPrefetcher(loader, self.device, memory_format=torch.contiguous_format)
+            pbar = tqdm(batches, desc=f"Epoch {epoch_str} [{mode}]", leave=False)
+            for batch_idx, (images, targets) in enumerate(pbar):
+                images = self.gpu_transform(images)
 
                 if train:
-                    self.optimizer.zero_grad()
+                    self.optimizer.zero_grad(set_to_none=True)
 
                 preds = self.model(images)
                 loss = self.criterion(preds, targets)
@@ -198,10 +211,11 @@ class AVATrainer:
                         )
                     self.optimizer.step()
 
-                total_loss += loss.item()
-                pbar.set_postfix({'loss': f"{loss.item():.4f}"})
+                total_loss += loss.detach()
+                if (batch_idx + 1) % log_every == 0:
+                    pbar.set_postfix({'loss': f"{total_loss.item() / (batch_idx + 1):.4f}"})
 
-        return total_loss / len(loader)
+        return total_loss.item() / len(loader)
 
     def train(self):
         print(f"\n{'='*60}")
@@ -210,6 +224,10 @@ class AVATrainer:
 
         start = time.time()
 
+        # One JSON line per epoch; plots are rendered from it outside the training process
+        metrics_path = self.output_dir / 'metrics.jsonl'
+        metrics_path.write_text('')
+
         for epoch in range(self.config['epochs']):
             self.current_epoch = epoch
 
@@ -226,6 +244,14 @@ class AVATrainer:
                 self.best_val_loss = val_loss
                 self._save(best=True)
             self._save(best=False)
+            with open(metrics_path, 'a') as f:
+                f.write(json.dumps({
+                    'epoch': epoch + 1,
+                    'train_loss': train_loss,
+                    'val_loss': val_loss,
+                    'lr': self.optimizer.param_groups[0]['lr'],
+                    'is_best': is_best,
+                }) + '\n')
 
             marker = " ✅ BEST" if is_best else ""
             print(
@@ -263,6 +289,10 @@ def main():
     parser = argparse.ArgumentParser(description='Pretrain on AVA aesthetic dataset')
     parser.add_argument('--ava_txt',    type=str,   default=r'C:\Users\harold\Downloads\archive\AVA_Files\AVA.txt')
     parser.add_argument('--images_dir', type=str,   default=r'C:\Users\harold\Downloads\archive\images')
+    parser.add_argument('--shards_dir', type=str,   default=None,
+                        help='Read images from .tar shards written by preprocess_ava.py')
+    parser.add_argument('--cache_dir',  type=str,   default=None,
+                        help='Read pre-decoded images from the uint8 cache written by preprocess_ava.py --format npy')
     parser.add_argument('--output_dir', type=str,   default='outputs/ava_pretrain')
     parser.add_argument('--backbone',   type=str,   default='resnet50')
     parser.add_argument('--epochs',     type=int,   default=30)
@@ -283,6 +313,8 @@ def main():
     config = {
         'ava_txt_path': args.ava_txt,
         'images_path': args.images_dir,
+        'shards_path': args.shards_dir,
+        'cache_path': args.cache_dir,
         'output_dir': args.output_dir,
         'backbone': args.backbone,
         'pretrained': not args.no_pretrained,
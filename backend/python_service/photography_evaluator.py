@@ -1,13 +1,15 @@
 import torch
 import torch.nn as nn
 from torchvision import models
-import torchvision.transforms as transforms
 from PIL import Image
+import numpy as np
 import json
 import sys
 import io
 import base64
 import os
+import pickle
+import struct
 try:
     import timm
     TIMM_AVAILABLE = True
@@ -22,26 +24,29 @@ class PhotographyEvaluationModel(nn.Module):
     Supports CNN (ResNet, EfficientNet) and Transformer (ViT) backbones.
     """
     
-    def __init__(self, backbone='resnet50', pretrained=True, dropout_rate=0.5):
+    def __init__(self, backbone='resnet50', pretrained=True, dropout_rate=0.5, head_norm='batchnorm'):
         super().__init__()
         
         self.backbone_name = backbone
+        if head_norm not in ('batchnorm', 'layernorm'):
+            raise ValueError(f"Unsupported head_norm: {head_norm}. Use: batchnorm, layernorm")
+        self.head_norm = head_norm
         
         # Backbone selection (CNN or Transformer)
         if backbone == 'resnet50':
-            self.backbone = models.resnet50(pretrained=pretrained)
+            self.backbone = models.resnet50(weights=models.ResNet50_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 2048
         elif backbone == 'resnet34':
-            self.backbone = models.resnet34(pretrained=pretrained)
+            self.backbone = models.resnet34(weights=models.ResNet34_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 512
         elif backbone == 'resnet18':
-            self.backbone = models.resnet18(pretrained=pretrained)
+            self.backbone = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.fc = nn.Identity()
             backbone_features = 512
         elif backbone == 'efficientnet_b0':
-            self.backbone = models.efficientnet_b0(pretrained=pretrained)
+            self.backbone = models.efficientnet_b0(weights=models.EfficientNet_B0_Weights.IMAGENET1K_V1 if pretrained else None)
             self.backbone.classifier = nn.Identity()
             backbone_features = 1280
         elif backbone.startswith('vit_'):
@@ -63,21 +68,54 @@ class PhotographyEvaluationModel(nn.Module):
     
     def _make_attribute_head(self, input_features, dropout_rate):
         """Create a regression head for one attribute."""
+        # LayerNorm has no running stats, so it behaves the same in train/eval and at batch size 1
+        norm = nn.LayerNorm if self.head_norm == 'layernorm' else nn.BatchNorm1d
         return nn.Sequential(
             nn.Dropout(dropout_rate),
             nn.Linear(input_features, 512),
-            nn.BatchNorm1d(512),
+            norm(512),
             nn.ReLU(inplace=True),
             
             nn.Dropout(dropout_rate / 2),
             nn.Linear(512, 256),
-            nn.BatchNorm1d(256),
+            norm(256),
             nn.ReLU(inplace=True),
             
             nn.Dropout(dropout_rate / 4),
             nn.Linear(256, 1)
         )
     
+    def fuse_heads_for_inference(self):
+        """
+        Rebuild the attribute heads for eval-only use (call after loading weights).
+        
+        Dropout is a no-op in eval mode and BatchNorm1d is a fixed per-channel
+        affine, so each head collapses to Linear -> ReLU -> Linear -> ReLU -> Linear
+        with the BN running stats folded into the preceding Linear.
+        LayerNorm heads only lose their Dropout layers.
+        """
+        for name in ('composition_head', 'color_head', 'focus_head', 'exposure_head'):
+            layers = []
+            for module in getattr(self, name):
+                if isinstance(module, nn.Dropout):
+                    continue
+                if isinstance(module, nn.BatchNorm1d) and layers and isinstance(layers[-1], nn.Linear):
+                    layers[-1] = self._fold_batchnorm(layers[-1], module)
+                    continue
+                layers.append(module)
+            setattr(self, name, nn.Sequential(*layers))
+    
+    @staticmethod
+    @torch.no_grad()
+    def _fold_batchnorm(linear, bn):
+        """Return a Linear equivalent to bn(linear(x)) with bn in eval mode."""
+        scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+        fused = nn.Linear(linear.in_features, linear.out_features,
+                          device=linear.weight.device, dtype=linear.weight.dtype)
+        fused.weight.copy_(linear.weight * scale.unsqueeze(1))
+        fused.bias.copy_((linear.bias - bn.running_mean) * scale + bn.bias)
+        return fused
+    
     def forward(self, x):
         """
         Forward pass.
@@ -99,14 +137,17 @@ class PhotographyEvaluationModel(nn.Module):
         if features.dim() > 2:
             features = torch.flatten(features, 1)
         
-        # Get predictions for each attribute (clamp to 0-100)
-        composition = torch.clamp(self.composition_head(features), 0, 100)
-        color = torch.clamp(self.color_head(features), 0, 100)
-        focus = torch.clamp(self.focus_head(features), 0, 100)
-        exposure = torch.clamp(self.exposure_head(features), 0, 100)
+        # Get predictions for each attribute (one clamp to 0-100 over all heads)
+        scores = torch.clamp(torch.cat([
+            self.composition_head(features),
+            self.color_head(features),
+            self.focus_head(features),
+            self.exposure_head(features)
+        ], dim=1), 0, 100)
+        composition, color, focus, exposure = scores.split(1, dim=1)
         
         # Calculate overall score as average
-        overall = (composition + color + focus + exposure) / 4
+        overall = scores.mean(dim=1, keepdim=True)
         
         return {
             'composition_score': composition,
@@ -116,6 +157,26 @@ class PhotographyEvaluationModel(nn.Module):
             'overall_score': overall
         }
 
+def load_checkpoint(path):
+    """
+    Load a checkpoint onto the CPU, memory-mapped (tensors are paged in from the
+    file as load_state_dict copies them) and without unpickling arbitrary objects.
+    
+    Same loader as ai-service/model.py: falls back to a full, non-mmap load only
+    for checkpoints in the legacy (non-zip) serialization format or holding
+    non-tensor objects; any other error is raised as is.
+    """
+    try:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    except pickle.UnpicklingError as e:
+        reason = f"checkpoint holds objects weights_only cannot load ({str(e).splitlines()[0]})"
+    except RuntimeError as e:
+        if 'mmap can only be used with files saved with' not in str(e):
+            raise
+        reason = "checkpoint uses the legacy serialization format"
+    print(f"Falling back to full checkpoint load: {reason}", file=sys.stderr)
+    return torch.load(path, map_location='cpu', weights_only=False)
+
 class PhotographyEvaluator:
     def __init__(self, model_path):
         """Load the trained photography evaluation model."""
@@ -125,8 +186,7 @@ class PhotographyEvaluator:
             print(f"Loading model from: {model_path}", file=sys.stderr)
             print(f"Using device: {self.device}", file=sys.stderr)
             
-            # Load checkpoint
-            checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
+            checkpoint = load_checkpoint(model_path)
             print(f"Checkpoint keys: {list(checkpoint.keys())}", file=sys.stderr)
             
             # Detect backbone from checkpoint config or state dict
@@ -141,15 +201,20 @@ class PhotographyEvaluator:
                     backbone = os.environ.get('MODEL_BACKBONE', 'vit_small_patch16_224')
                     print(f"Detected ViT architecture from state dict, using: {backbone}", file=sys.stderr)
             
-            print(f"Creating model with backbone: {backbone}", file=sys.stderr)
+            # Checkpoints from before head_norm existed all use BatchNorm heads
+            head_norm = checkpoint.get('config', {}).get('head_norm', 'batchnorm')
+            
+            print(f"Creating model with backbone: {backbone} (head norm: {head_norm})", file=sys.stderr)
             
             # Create model with matching architecture
             self.model = PhotographyEvaluationModel(
                 backbone=backbone,
                 pretrained=False,  # Don't load pretrained weights
-                dropout_rate=0.5
+                dropout_rate=0.5,
+                head_norm=head_norm
             )
-            self.model = self.model.to(self.device)
+            # channels_last (NHWC) lets the conv kernels use their faster layout
+            self.model = self.model.to(self.device, memory_format=torch.channels_last)
             
             # Load trained weights
             if 'model_state_dict' in checkpoint:
@@ -163,19 +228,48 @@ class PhotographyEvaluator:
             self.model.load_state_dict(state_dict, strict=True)
             
             self.model.eval()
+            self.model.fuse_heads_for_inference()
             print("✅ Model loaded successfully!", file=sys.stderr)
             
+            # Optional int8 dynamic quantization of the head Linears for CPU serving
+            # (MODEL_QUANTIZE=1); int8 kernels exist only on CPU, so GPU stays FP32
+            quantized = False
+            if os.environ.get('MODEL_QUANTIZE', '').lower() in ('1', 'true', 'int8') and self.device.type == 'cpu':
+                engines = torch.backends.quantized.supported_engines
+                engine = 'fbgemm' if 'fbgemm' in engines else 'qnnpack' if 'qnnpack' in engines else None
+                if engine:
+                    torch.backends.quantized.engine = engine
+                    self.model = torch.ao.quantization.quantize_dynamic(
+                        self.model, {nn.Linear}, dtype=torch.qint8
+                    )
+                    quantized = True
+                    print(f"Quantized Linear layers to int8 ({engine})", file=sys.stderr)
+            
+            # Optional torch.compile (e.g. MODEL_COMPILE=max-autotune); compiled kernels
+            # are cached on disk so only the first process pays the full compile time
+            compile_mode = os.environ.get('MODEL_COMPILE')
+            if compile_mode and not quantized and hasattr(self.model, 'compile'):
+                os.environ.setdefault(
+                    'TORCHINDUCTOR_CACHE_DIR',
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.inductor_cache')
+                )
+                print(f"Compiling model (mode: {compile_mode})...", file=sys.stderr)
+                self.model.compile(mode=compile_mode)
+                with torch.inference_mode():
+                    self.model(torch.zeros(1, 3, 224, 224, device=self.device)
+                               .contiguous(memory_format=torch.channels_last))
+            
             # Print model info
             total_params = sum(p.numel() for p in self.model.parameters())
             print(f"Model parameters: {total_params:,}", file=sys.stderr)
             
-            # Image preprocessing (same as training)
-            self.transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                                   std=[0.229, 0.224, 0.225])
-            ])
+            # Image preprocessing (same as training: bilinear resize to 224x224 +
+            # ImageNet normalization), folded into one multiply-add on the uint8 pixels:
+            #   (x / 255 - mean) / std  ==  x * (1 / (255 * std)) - mean / std
+            mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+            inv_std = 1.0 / np.array([0.229, 0.224, 0.225], dtype=np.float32)
+            self._pixel_scale = inv_std / 255.0
+            self._pixel_shift = mean * inv_std
         except Exception as e:
             error_msg = f"Failed to load model: {str(e)}"
             print(error_msg, file=sys.stderr)
@@ -192,20 +286,25 @@ class PhotographyEvaluator:
             
             print(f"Image loaded: {image.size}", file=sys.stderr)
             
-            # Preprocess
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+            # Preprocess: HWC float32 is already the channels_last layout, so the
+            # NCHW view below needs no copy before moving to the device
+            image = image.resize((224, 224), Image.BILINEAR)
+            pixels = np.asarray(image, dtype=np.float32) * self._pixel_scale - self._pixel_shift
+            input_tensor = torch.from_numpy(pixels).permute(2, 0, 1).unsqueeze(0).to(self.device)
             print(f"Input tensor shape: {input_tensor.shape}", file=sys.stderr)
 
             # Predict
-            with torch.no_grad():
+            with torch.inference_mode():
                 predictions = self.model(input_tensor)
             
-            # Extract scores (already clamped to 0-100 in model)
-            composition_score = predictions['composition_score'].item()
-            color_score = predictions['color_score'].item()
-            focus_score = predictions['focus_score'].item()
-            exposure_score = predictions['exposure_score'].item()
-            overall_score = predictions['overall_score'].item()
+            # Extract scores (already clamped to 0-100 in model) in one device->host transfer
+            composition_score, color_score, focus_score, exposure_score, overall_score = torch.cat([
+                predictions['composition_score'].reshape(-1),
+                predictions['color_score'].reshape(-1),
+                predictions['focus_score'].reshape(-1),
+                predictions['exposure_score'].reshape(-1),
+                predictions['overall_score'].reshape(-1)
+            ]).tolist()
             
             print(f"Predicted scores:", file=sys.stderr)
             print(f"  Composition: {composition_score:.1f}", file=sys.stderr)
@@ -238,12 +337,84 @@ class PhotographyEvaluator:
                 'overall_score': 50
             }
 
+def get_model_path():
+    """Model checkpoint path from CUSTOM_MODEL_PATH (relative paths are resolved from this file)."""
+    model_path = os.environ.get('CUSTOM_MODEL_PATH', 
+                               '../../ai-service/outputs/ava_finetuned_3/best_model.pth')
+    
+    # Make path absolute
+    if not os.path.isabs(model_path):
+        model_path = os.path.join(os.path.dirname(__file__), model_path)
+    
+    print(f"Using model path: {model_path}", file=sys.stderr)
+    
+    # Check if model file exists
+    if not os.path.exists(model_path):
+        raise Exception(f"Model file not found: {model_path}")
+    
+    return model_path
+
+
+def _read_exact(stream, n):
+    """Read exactly n bytes from a binary stream (None if it closes first)."""
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _write_frame(stream, result):
+    """Write a result dict as a length-prefixed JSON frame."""
+    payload = json.dumps(result).encode('utf-8')
+    stream.write(struct.pack('>I', len(payload)) + payload)
+    stream.flush()
+
+
+def serve():
+    """
+    Long-lived mode for Node.js: load the model once, then answer requests
+    in order over stdin/stdout. Both directions use length-prefixed frames
+    (4-byte big-endian length + payload): raw image bytes in, a JSON result
+    out. The first frame out is {"ready": true} once the model is loaded, so
+    the caller can time model startup separately from requests. Exits when
+    stdin is closed.
+    """
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # stdout carries only frames; any stray print() goes to the stderr log instead
+    sys.stdout = sys.stderr
+    
+    try:
+        evaluator = PhotographyEvaluator(get_model_path())
+    except Exception as e:
+        _write_frame(stdout, {'error': f"Main execution error: {str(e)}"})
+        return
+    _write_frame(stdout, {'ready': True})
+    
+    while True:
+        header = _read_exact(stdin, 4)
+        if header is None:
+            break
+        (length,) = struct.unpack('>I', header)
+        image_buffer = _read_exact(stdin, length)
+        if image_buffer is None:
+            break
+        print(f"Received image: {length} bytes", file=sys.stderr)
+        _write_frame(stdout, evaluator.evaluate_image(image_buffer))
+
+
 def main():
     """CLI interface for Node.js integration."""
     if len(sys.argv) < 2:
         print(json.dumps({'error': 'No image data provided'}))
         return
     
+    if sys.argv[1] == '--server':
+        serve()
+        return
+    
     try:
         # Get image file path from command line (instead of base64)
         image_path_arg = sys.argv[1]
@@ -276,22 +447,8 @@ def main():
             image_buffer = base64.b64decode(image_path_arg)
             print(f"✅ Decoded base64 image: {len(image_buffer)} bytes", file=sys.stderr)
         
-        # Get model path from environment or use default
-        model_path = os.environ.get('CUSTOM_MODEL_PATH', 
-                                   '../../ai-service/outputs/ava_finetuned_3/best_model.pth')
-        
-        # Make path absolute
-        if not os.path.isabs(model_path):
-            model_path = os.path.join(os.path.dirname(__file__), model_path)
-        
-        print(f"Using model path: {model_path}", file=sys.stderr)
-        
-        # Check if model file exists
-        if not os.path.exists(model_path):
-            raise Exception(f"Model file not found: {model_path}")
-        
         # Load model and evaluate
-        evaluator = PhotographyEvaluator(model_path)
+        evaluator = PhotographyEvaluator(get_model_path())
         result = evaluator.evaluate_image(image_buffer)
         
         # Output JSON for Node.js
@@ -1,8 +1,6 @@
 const vision = require('@google-cloud/vision');
 const { spawn } = require('child_process');
 const path = require('path');
-const fs = require('fs');
-const os = require('os');
 
 // Initialize the Vision API client
 let visionClient;
@@ -25,90 +23,147 @@ try {
 }
 
 // CUSTOM AI MODEL FUNCTIONS
-const callPhotographyModel = (imageBuffer) => {
-  return new Promise((resolve, reject) => {
-    const modelPath = path.join(__dirname, '../python_service/photography_evaluator.py');
-    const pythonPath = process.env.PYTHON_PATH || 'python3';
-    
-    // Create temporary file instead of using command line argument
-    const tempDir = os.tmpdir();
-    const tempImagePath = path.join(tempDir, `temp_image_${Date.now()}_${Math.random().toString(36).substr(2, 9)}.jpg`);
-    
-    try {
-      // Write image buffer to temporary file
-      fs.writeFileSync(tempImagePath, imageBuffer);
-      
-      console.log(`📁 Created temp file: ${tempImagePath} (${imageBuffer.length} bytes)`);
-      
-      // Pass temp file path instead of base64 data
-      const pythonProcess = spawn(pythonPath, [modelPath, tempImagePath], {
-        env: { ...process.env, CUSTOM_MODEL_PATH: process.env.CUSTOM_MODEL_PATH }
-      });
-      
-      let result = '';
-      let error = '';
-      
-      pythonProcess.stdout.on('data', (data) => {
-        result += data.toString();
-      });
-      
-      pythonProcess.stderr.on('data', (data) => {
-        error += data.toString();
-      });
-      
-      pythonProcess.on('close', (code) => {
-        // Clean up temporary file
-        try {
-          if (fs.existsSync(tempImagePath)) {
-            fs.unlinkSync(tempImagePath);
-            console.log(`🗑️  Cleaned up temp file: ${tempImagePath}`);
-          }
-        } catch (cleanupError) {
-          console.error('⚠️  Failed to cleanup temp file:', cleanupError.message);
-        }
-        
-        if (code === 0) {
-          try {
-            const modelOutput = JSON.parse(result);
-            resolve(modelOutput);
-          } catch (e) {
-            reject(new Error(`Failed to parse model output: ${e.message}`));
-          }
+
+// One long-lived Python evaluator (photography_evaluator.py --server) loads the
+// model once and answers requests over stdin/stdout. Both directions use
+// length-prefixed frames (4-byte big-endian length + payload): raw image bytes
+// in, a JSON result out, answered in the order they were sent. The first frame
+// out is {"ready": true} once the model is loaded (or {"error": ...} if it failed).
+let currentEvaluator = null;
+
+// Reject everything still waiting on this evaluator; the next request spawns a new one
+const failEvaluator = (evaluator, error) => {
+  if (currentEvaluator === evaluator) {
+    currentEvaluator = null;
+  }
+  clearTimeout(evaluator.startupTimer);
+  evaluator.pending.splice(0).forEach((request) => request.reject(error));
+};
+
+// The evaluator works on one request at a time, so only the head of the queue is
+// timed, starting once the model is loaded and the request is actually being served
+const armHeadTimer = (evaluator) => {
+  const head = evaluator.pending[0];
+  if (!evaluator.ready || !head || head.timer) return;
+
+  const timeout = parseInt(process.env.MODEL_TIMEOUT) || 15000;
+  head.timer = setTimeout(() => {
+    // Stuck on this request: fail only it, restart the process and resend the rest
+    const [stuck, ...queued] = evaluator.pending.splice(0);
+    if (currentEvaluator === evaluator) {
+      currentEvaluator = null;
+    }
+    evaluator.process.kill();
+    stuck.reject(new Error('Model execution timeout'));
+    queued.forEach((request) => sendRequest(getEvaluator(), request));
+  }, timeout);
+};
+
+const sendRequest = (evaluator, request) => {
+  evaluator.pending.push(request);
+
+  // Image bytes go straight to the model process (no temp file, no base64)
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(request.imageBuffer.length, 0);
+  evaluator.process.stdin.write(header);
+  evaluator.process.stdin.write(request.imageBuffer);
+
+  armHeadTimer(evaluator);
+};
+
+const startEvaluator = () => {
+  const modelPath = path.join(__dirname, '../python_service/photography_evaluator.py');
+  const pythonPath = process.env.PYTHON_PATH || 'python3';
+
+  const pythonProcess = spawn(pythonPath, [modelPath, '--server'], {
+    env: { ...process.env, CUSTOM_MODEL_PATH: process.env.CUSTOM_MODEL_PATH }
+  });
+  const evaluator = { process: pythonProcess, pending: [], ready: false, stdout: Buffer.alloc(0), stderr: '' };
+  console.log(`🚀 Started photography model process (pid ${pythonProcess.pid})`);
+
+  // Model load (plus the optional MODEL_COMPILE warm-up) gets its own, longer budget
+  const startupTimeout = parseInt(process.env.MODEL_STARTUP_TIMEOUT) || 120000;
+  evaluator.startupTimer = setTimeout(() => {
+    pythonProcess.kill();
+    failEvaluator(evaluator, new Error('Model startup timeout'));
+  }, startupTimeout);
+
+  pythonProcess.stdout.on('data', (data) => {
+    evaluator.stdout = Buffer.concat([evaluator.stdout, data]);
+    while (evaluator.stdout.length >= 4) {
+      const frameLength = evaluator.stdout.readUInt32BE(0);
+      if (evaluator.stdout.length < 4 + frameLength) break;
+      const payload = evaluator.stdout.subarray(4, 4 + frameLength).toString('utf8');
+      evaluator.stdout = evaluator.stdout.subarray(4 + frameLength);
+
+      let message;
+      try {
+        message = JSON.parse(payload);
+      } catch (e) {
+        const request = evaluator.pending.shift();
+        if (request) request.reject(new Error(`Failed to parse model output: ${e.message}`));
+        armHeadTimer(evaluator);
+        continue;
+      }
+
+      if (!evaluator.ready) {
+        if (message.ready) {
+          evaluator.ready = true;
+          clearTimeout(evaluator.startupTimer);
+          console.log(`✅ Photography model ready (pid ${pythonProcess.pid})`);
+          armHeadTimer(evaluator);
         } else {
-          reject(new Error(`Model execution failed (code ${code}): ${error}`));
+          failEvaluator(evaluator, new Error(message.error || 'Model failed to start'));
         }
-      });
-      
-      pythonProcess.on('error', (err) => {
-        // Clean up on process error
-        try {
-          if (fs.existsSync(tempImagePath)) {
-            fs.unlinkSync(tempImagePath);
-          }
-        } catch (cleanupError) {
-          console.error('⚠️  Failed to cleanup temp file on error:', cleanupError.message);
-        }
-        reject(err);
-      });
-      
-      const timeout = parseInt(process.env.MODEL_TIMEOUT) || 15000;
-      setTimeout(() => {
-        pythonProcess.kill();
-        // Clean up on timeout
-        try {
-          if (fs.existsSync(tempImagePath)) {
-            fs.unlinkSync(tempImagePath);
-          }
-        } catch (cleanupError) {
-          console.error('⚠️  Failed to cleanup temp file on timeout:', cleanupError.message);
-        }
-        reject(new Error('Model execution timeout'));
-      }, timeout);
-      
-    } catch (fileError) {
-      reject(new Error(`Failed to create temporary file: ${fileError.message}`));
+        continue;
+      }
+
+      const request = evaluator.pending.shift();
+      if (request) request.resolve(message);
+      armHeadTimer(evaluator);
     }
   });
+
+  // Keep only the tail of stderr (the evaluator logs every request there) for error messages
+  pythonProcess.stderr.on('data', (data) => {
+    evaluator.stderr = (evaluator.stderr + data.toString()).slice(-4000);
+  });
+
+  pythonProcess.on('close', (code) => {
+    failEvaluator(evaluator, new Error(`Model execution failed (code ${code}): ${evaluator.stderr}`));
+  });
+
+  pythonProcess.on('error', (err) => {
+    failEvaluator(evaluator, err);
+  });
+
+  pythonProcess.stdin.on('error', (err) => {
+    failEvaluator(evaluator, new Error(`Failed to send request to model: ${err.message}`));
+  });
+
+  return evaluator;
+};
+
+const getEvaluator = () => {
+  if (!currentEvaluator) {
+    currentEvaluator = startEvaluator();
+  }
+  return currentEvaluator;
+};
+
+const callPhotographyModel = (imageBuffer) => {
+  return new Promise((resolve, reject) => {
+    let settled = false;
+    const settle = (callback) => (value) => {
+      if (settled) return;
+      settled = true;
+      clearTimeout(request.timer);
+      callback(value);
+    };
+    const request = { imageBuffer, resolve: settle(resolve), reject: settle(reject) };
+
+    sendRequest(getEvaluator(), request);
+  });
 };
 
 const getAestheticRating = (score) => {